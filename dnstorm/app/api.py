@@ -0,0 +1,281 @@
+import calendar
+import hashlib
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db.models import Q
+from django.utils.http import http_date
+
+from dnstorm import settings
+from dnstorm.app import perms
+from dnstorm.app.models import Alternative, Comment, Criteria, Idea, IdeaCriteria, Problem, Result
+from dnstorm.app.pagination import CursorPaginator
+from dnstorm.app.results import complete_results
+
+VERSION = 1
+
+class ApiError(ValueError):
+    """
+    Raised for invalid parameters of an API request.
+    """
+
+# Fields of each resource, in output order. Model fields are given as they
+# are stored, with the id of the related objects, and the others are
+# computed by ``LOADERS``.
+FIELDS = {
+    'problem': ['id', 'title', 'slug', 'url', 'description', 'author', 'published', 'open', 'public',
+        'created', 'updated', 'last_activity', 'idea_count', 'criteria_count', 'alternative_count', 'comment_count'],
+    'criteria': ['id', 'problem', 'name', 'slug', 'description', 'fmt', 'min', 'max', 'order', 'weight',
+        'result', 'author', 'created', 'updated'],
+    'idea': ['id', 'problem', 'title', 'description', 'author', 'published', 'created', 'updated',
+        'vote_count', 'comment_count', 'values'],
+    'alternative': ['id', 'problem', 'name', 'order', 'author', 'created', 'updated', 'vote_count',
+        'vote_average', 'comment_count', 'ideas'],
+    'result': ['id', 'problem', 'alternative', 'criteria', 'value', 'updated'],
+    'comment': ['id', 'problem', 'criteria', 'idea', 'alternative', 'content', 'author', 'created', 'updated'],
+}
+
+# Columns always loaded for each resource, as they make its ETag and its
+# Last-Modified date.
+VERSION_FIELDS = {
+    'problem': ['updated', 'last_activity', 'idea_count', 'criteria_count', 'alternative_count', 'comment_count'],
+    'criteria': ['updated'],
+    'idea': ['updated', 'vote_count', 'comment_count'],
+    'alternative': ['updated', 'vote_count', 'vote_sum', 'comment_count'],
+    'result': ['updated'],
+    'comment': ['updated'],
+}
+
+# Columns needed by the computed fields
+COLUMNS = {
+    'url': ['slug'],
+    'author': ['author'],
+    'vote_average': ['vote_sum', 'vote_count'],
+}
+
+MODELS = {
+    'problem': Problem,
+    'criteria': Criteria,
+    'idea': Idea,
+    'alternative': Alternative,
+    'result': Result,
+    'comment': Comment,
+}
+
+# Collections of a problem by name, with their resource and the objects of
+# the given problems a user can view.
+COLLECTIONS = OrderedDict([
+    ('criteria', ('criteria', lambda user, ids: Criteria.objects.filter(problem__in=ids))),
+    ('ideas', ('idea', lambda user, ids: Idea.objects.filter(ideas_visible(user), problem__in=ids))),
+    ('alternatives', ('alternative', lambda user, ids: Alternative.objects.filter(problem__in=ids))),
+    ('results', ('result', lambda user, ids: Result.objects.filter(problem__in=ids))),
+    ('comments', ('comment', lambda user, ids: Comment.objects.filter(
+        Q(problem__in=ids) | Q(criteria__problem__in=ids) | Q(idea__problem__in=ids) | Q(alternative__problem__in=ids)).filter(
+        Q(idea__isnull=True) | ideas_visible(user, 'idea__')))),
+])
+
+def ideas_visible(user, prefix=''):
+    """
+    Filter of the published ideas and of the drafts of the user.
+    """
+    q = Q(**{'%spublished' % prefix: True})
+    if user.is_authenticated():
+        q |= Q(**{'%sauthor' % prefix: user})
+    return q
+
+def load_author(objs):
+    users = dict(User.objects.filter(id__in=set(o.author_id for o in objs)).values_list('id', 'username'))
+    for o in objs:
+        o.api_author = {'id': o.author_id, 'username': users.get(o.author_id)}
+
+def load_url(objs):
+    for o in objs:
+        o.api_url = o.get_absolute_url()
+
+def load_vote_average(objs):
+    for o in objs:
+        o.api_vote_average = round(float(o.vote_sum) / o.vote_count, 2) if o.vote_count else 0
+
+def load_values(objs):
+    values = dict()
+    for ic in IdeaCriteria.objects.filter(idea__in=objs).select_related('criteria').order_by('criteria__name', 'criteria'):
+        values.setdefault(ic.idea_id, list()).append({'criteria': ic.criteria_id, 'value': ic.get_value(),
+            'description': ic.description})
+    for o in objs:
+        o.api_values = values.get(o.id, list())
+
+def load_ideas(objs):
+    ideas = dict()
+    for a, i in Alternative.idea.through.objects.filter(alternative__in=objs).order_by('idea').values_list('alternative', 'idea'):
+        ideas.setdefault(a, list()).append(i)
+    for o in objs:
+        o.api_ideas = ideas.get(o.id, list())
+
+# Loaders of the computed fields, each one filling the ``api_<field>``
+# attribute of all the objects at once.
+LOADERS = {
+    'url': load_url,
+    'author': load_author,
+    'vote_average': load_vote_average,
+    'values': load_values,
+    'ideas': load_ideas,
+}
+
+def split(value):
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+def fieldset(params, resource, primary=False):
+    """
+    Fields requested for a resource in the ``fields[<resource>]`` parameter,
+    or in ``fields`` for the primary resource, all of them by default.
+    """
+    fields = split(params.get('fields[%s]' % resource) or (params.get('fields') if primary else None))
+    unknown = [f for f in fields if f not in FIELDS[resource]]
+    if unknown:
+        raise ApiError('Unknown fields for %s: %s.' % (resource, ', '.join(unknown)))
+    return ['id'] + [f for f in FIELDS[resource] if f in fields and f != 'id'] if fields else FIELDS[resource]
+
+def queryset(qs, resource, fields):
+    """
+    The queryset loading only the columns of the fields and of the version
+    of the resource.
+    """
+    model = MODELS[resource]
+    names = set(f.name for f in model._meta.fields)
+    columns = set(['id'] + VERSION_FIELDS[resource])
+    for f in fields:
+        columns.update(c for c in COLUMNS.get(f, [f]) if c in names)
+    return qs.only(*columns)
+
+def serialize(objs, resource, fields):
+    """
+    The objects as dicts with the requested fields, loading the computed
+    ones in bulk.
+    """
+    for f in fields:
+        if f in LOADERS and objs:
+            LOADERS[f](objs)
+    model = MODELS[resource]
+    attnames = dict((f.name, f.attname) for f in model._meta.fields)
+    data = list()
+    for o in objs:
+        item = OrderedDict()
+        for f in fields:
+            value = getattr(o, 'api_%s' % f) if f in LOADERS else getattr(o, attnames[f])
+            item[f] = value.isoformat() if hasattr(value, 'isoformat') else value
+        data.append(item)
+    return data
+
+def embed(params, user, problems, objects):
+    """
+    Loads the collections given in the ``embed`` parameter of the problems,
+    with a single query for each collection of all of them. Returns the
+    function adding them to the serialized problems.
+    """
+    names = split(params.get('embed'))
+    unknown = [n for n in names if n not in COLLECTIONS]
+    if unknown:
+        raise ApiError('Unknown collections to embed: %s.' % ', '.join(unknown))
+    if 'results' in names:
+        complete_results(problems)
+    collections = list()
+    for name in names:
+        resource, query = COLLECTIONS[name]
+        fields = fieldset(params, resource)
+        objs = list(queryset(query(user, [p.id for p in problems]), resource, fields).order_by('id'))
+        objects.extend((resource, o) for o in objs)
+        collections.append((name, resource, fields, objs))
+
+    def render(data):
+        for name, resource, fields, objs in collections:
+            owners = problem_ids(resource, objs)
+            by_problem = dict()
+            for o, item in zip(objs, serialize(objs, resource, fields)):
+                by_problem.setdefault(owners[o.id], list()).append(item)
+            for p, item in zip(problems, data):
+                item[name] = by_problem.get(p.id, list())
+    return render
+
+def problem_ids(resource, objs):
+    """
+    Problems of the objects by id. Comments belong to the problem of the
+    object they were made for, read for all of them in a single query.
+    """
+    if resource != 'comment':
+        return dict((o.id, o.problem_id) for o in objs)
+    rows = Comment.objects.filter(id__in=[o.id for o in objs]).values_list(
+        'id', 'problem', 'criteria__problem', 'idea__problem', 'alternative__problem')
+    return dict((row[0], next((p for p in row[1:] if p), None)) for row in rows)
+
+def limit(params):
+    try:
+        value = int(params.get('limit') or settings.DNSTORM.get('api_page_size', 25))
+    except ValueError:
+        raise ApiError('Invalid limit.')
+    return max(1, min(value, settings.DNSTORM.get('api_max_page_size', 100)))
+
+def page(qs, params, ordering):
+    return CursorPaginator(qs, limit(params), ordering).page(params.get('cursor'))
+
+def problems(user, params):
+    """
+    Page of the problems the user can view ordered by their last activity.
+    Returns the function serializing the data, the page and the loaded
+    objects, so the ``validators`` can be checked before serializing.
+    """
+    fields = fieldset(params, 'problem', primary=True)
+    p = page(queryset(Problem.objects.filter(perms.problem_filter(user)), 'problem', fields), params, '-last_activity')
+    objs = list(p.object_list)
+    objects = [('problem', o) for o in objs]
+    embedded = embed(params, user, objs, objects)
+
+    def render():
+        data = serialize(objs, 'problem', fields)
+        embedded(data)
+        return data
+    return render, p, objects
+
+def problem(user, params, obj):
+    """
+    A problem the user can view, with the embedded collections.
+    """
+    fields = fieldset(params, 'problem', primary=True)
+    objects = [('problem', obj)]
+    embedded = embed(params, user, [obj], objects)
+
+    def render():
+        data = serialize([obj], 'problem', fields)
+        embedded(data)
+        return data[0]
+    return render, objects
+
+def collection(user, params, obj, name):
+    """
+    Page of a collection of a problem the user can view, ordered by id.
+    """
+    resource, query = COLLECTIONS[name]
+    fields = fieldset(params, resource, primary=True)
+    if name == 'results':
+        complete_results([obj])
+    p = page(queryset(query(user, [obj.id]), resource, fields), params, 'id')
+    objs = list(p.object_list)
+    return lambda: serialize(objs, resource, fields), p, [('problem', obj)] + [(resource, o) for o in objs]
+
+def validators(key, objects):
+    """
+    ETag and Last-Modified date of a response made of the given objects.
+    The ETag changes with the request ``key`` and with the id and the
+    version fields of every object, so it also changes when an object is
+    removed, and the date is the latest of their ``updated`` and
+    ``last_activity`` dates.
+    """
+    md5 = hashlib.md5('%d:%s' % (VERSION, key.encode('utf-8')))
+    modified = None
+    for resource, o in objects:
+        values = [getattr(o, f) for f in VERSION_FIELDS[resource]]
+        md5.update('%s:%d:%s;' % (resource, o.id, ':'.join(unicode(v) for v in values)))
+        for v in values:
+            if hasattr(v, 'utctimetuple') and (not modified or v > modified):
+                modified = v
+    return 'W/"%s"' % md5.hexdigest(), http_date(calendar.timegm(modified.utctimetuple())) if modified else None
@@ -0,0 +1,234 @@
+"""
+Benchmarks of the hot code paths, run in-process against a synthetic
+dataset from ``dnstorm.app.benchmark.data``. Cases are registered with the
+``case`` decorator and measured by ``run`` with the instrumentation of
+``dnstorm.app.metrics``.
+"""
+import gc
+import math
+import platform
+import resource
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from dnstorm import settings
+from dnstorm.app import metrics
+
+CASES = OrderedDict()
+
+def case(name, setup=None):
+    """
+    Decorator to register a benchmark case. Cases receive the context built
+    by ``run`` and the value returned by ``setup``, which is called before
+    each repetition and is not measured.
+    """
+    def register(function):
+        CASES[name] = (function, setup)
+        return function
+    return register
+
+@contextmanager
+def test_database(verbosity=0):
+    """
+    Runs the block in an empty test database, migrated by South, with the
+    cache cleared. Requests are measured by the cases and not by the
+    metrics middleware.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from south.management.commands import patch_for_test_db_setup
+    settings.DNSTORM['metrics'] = False
+    setup_test_environment()
+    patch_for_test_db_setup()
+    name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    cache.clear()
+    ContentType.objects.clear_cache()
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(name, verbosity=verbosity)
+        # Closing drops in-memory databases, which ignore it while in use
+        connection.settings_dict['NAME'] = name
+        connection.close()
+        teardown_test_environment()
+
+def clients(context):
+    """
+    Test clients logged in as each of the users of a generated dataset.
+    """
+    from dnstorm.app.benchmark.data import PASSWORD
+    clients = {'anonymous': Client()}
+    for role in ['author', 'collaborator', 'outsider', 'superuser']:
+        clients[role] = Client()
+        clients[role].login(username=context[role].username, password=PASSWORD)
+    return clients
+
+def ajax(client, method='get', **data):
+    return getattr(client, method)(reverse('ajax'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+# Views
+
+@case('home:anonymous')
+def home_anonymous(context, prepared):
+    return context['clients']['anonymous'].get(reverse('home'))
+
+@case('home:collaborator')
+def home_collaborator(context, prepared):
+    return context['clients']['collaborator'].get(reverse('home'))
+
+@case('problem:anonymous')
+def problem_anonymous(context, prepared):
+    return context['clients']['anonymous'].get(context['problem'].get_absolute_url())
+
+@case('problem:collaborator')
+def problem_collaborator(context, prepared):
+    return context['clients']['collaborator'].get(context['problem'].get_absolute_url())
+
+@case('problem:author')
+def problem_author(context, prepared):
+    return context['clients']['author'].get(context['problem'].get_absolute_url())
+
+@case('activity')
+def activity(context, prepared):
+    return context['clients']['collaborator'].get(reverse('activity'))
+
+@case('activity_problem')
+def activity_problem(context, prepared):
+    return context['clients']['collaborator'].get(reverse('activity_problem', args=[context['problem'].id]))
+
+# Ajax actions
+
+@case('ajax:user_search')
+def ajax_user_search(context, prepared):
+    return ajax(context['clients']['collaborator'], user_search=context['outsider'].first_name[:3])
+
+def remove_outsider(context):
+    context['problem'].collaborator.remove(context['outsider'])
+
+def add_outsider(context):
+    context['problem'].collaborator.add(context['outsider'])
+
+@case('ajax:collaborator_add', setup=remove_outsider)
+def ajax_collaborator_add(context, prepared):
+    return ajax(context['clients']['author'], collaborator_add=context['outsider'].username, problem=context['problem'].id)
+
+@case('ajax:collaborator_delete', setup=add_outsider)
+def ajax_collaborator_delete(context, prepared):
+    return ajax(context['clients']['author'], collaborator_delete=context['outsider'].username, problem=context['problem'].id)
+
+@case('ajax:idea_like')
+def ajax_idea_like(context, prepared):
+    return ajax(context['clients']['collaborator'], idea_like=context['idea'].id)
+
+@case('ajax:alternative_like')
+def ajax_alternative_like(context, prepared):
+    return ajax(context['clients']['collaborator'], alternative_like=context['alternative'].id, value=50)
+
+@case('ajax:activity_reset_counter')
+def ajax_activity_reset_counter(context, prepared):
+    return ajax(context['clients']['collaborator'], activity_reset_counter=1)
+
+@case('ajax:help')
+def ajax_help(context, prepared):
+    return ajax(context['clients']['collaborator'], help=1)
+
+@case('ajax:comment_new')
+def ajax_comment_new(context, prepared):
+    return ajax(context['clients']['collaborator'], 'post', comment_new=1, idea=context['idea'].id, content='Benchmark comment')
+
+# Functions
+
+@case('activity_register')
+def activity_register(context, prepared):
+    from dnstorm.app.utils import activity_register
+    activity_register(context['collaborator'], context['idea'])
+
+@case('activity_process')
+def activity_process(context, prepared):
+    from dnstorm.app.utils import activity_process
+    activity_process(context['collaborator'], context['idea'])
+
+def load_alternative(context):
+    from dnstorm.app.models import Alternative
+    return Alternative.objects.get(id=context['alternative'].id)
+
+@case('Alternative.fill_data', setup=load_alternative)
+def alternative_fill_data(context, prepared):
+    prepared.fill_data(context['collaborator'])
+
+# Measures
+
+def peak_memory():
+    """
+    Peak resident memory of the process in kilobytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if platform.system() == 'Darwin' else rss
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+def summary(values):
+    return {
+        'min': round(min(values), 2),
+        'avg': round(float(sum(values)) / len(values), 2),
+        'p50': round(percentile(values, 50), 2),
+        'p90': round(percentile(values, 90), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(max(values), 2),
+    }
+
+def measure(name, context, repeat=10, warmup=2):
+    """
+    Runs a case ``warmup`` times unmeasured and then ``repeat`` times,
+    returning the query counts, times in milliseconds and peak memory.
+    Responses with error status codes are counted as errors.
+    """
+    function, setup = CASES[name]
+    measures, errors = list(), 0
+    memory = peak_memory()
+    for i in range(warmup + repeat):
+        prepared = setup(context) if setup else None
+        gc.collect()
+        metrics.start()
+        try:
+            response = function(context, prepared)
+        finally:
+            values = metrics.stop(None)
+        if i < warmup:
+            continue
+        measures.append(values)
+        if response is not None and response.status_code >= 400:
+            errors += 1
+    return {
+        'name': name,
+        'repeat': repeat,
+        'errors': errors,
+        'queries': summary([m['queries'] for m in measures]),
+        'time': summary([m['total_time'] for m in measures]),
+        'db_time': summary([m['db_time'] for m in measures]),
+        'render_time': summary([m['render_time'] for m in measures]),
+        'peak_memory': peak_memory(),
+        'memory_growth': peak_memory() - memory,
+    }
+
+def run(context, names=None, repeat=10, warmup=2):
+    """
+    Measures the given cases, or all of them, in the order they were
+    registered.
+    """
+    metrics.install()
+    return [measure(name, context, repeat, warmup) for name in CASES if not names or name in names]
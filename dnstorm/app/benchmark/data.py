@@ -0,0 +1,177 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.utils import timezone
+
+from actstream.models import Action, Follow
+
+from dnstorm.app import counters, search, user_index
+from dnstorm.app.models import Alternative, Comment, Criteria, Idea, IdeaCriteria, Problem, Vote
+from dnstorm.app.results import update_results
+
+# Sizes of the default dataset, all of them per problem but the users and
+# the problems.
+SIZES = {
+    'users': 200,
+    'problems': 20,
+    'collaborators': 10,
+    'criteria': 5,
+    'ideas': 30,
+    'alternatives': 6,
+    'comments': 40,
+    'votes': 60,
+}
+
+WORDS = ('energy water city school transport market health budget network '
+    'garden river solar waste food housing park library bridge traffic '
+    'clinic farm forest museum harbour market recycling rail wind').split()
+
+NAMES = ('Ana Bruno Carla Daniel Elisa Fabio Gabriela Hugo Iris Joao Karen '
+    'Lucas Marina Nuno Olga Paulo Rita Sergio Tania Vitor').split()
+
+FORMATS = [('number', 'sum', 'asc'), ('currency', 'sum', 'desc'),
+    ('scale', 'average', 'asc'), ('time', 'absolute', 'desc'), ('boolean', 'sum', 'asc')]
+
+# Smallest sizes giving the objects returned by ``generate``
+MINIMUM = {
+    'users': 3,
+    'problems': 1,
+    'collaborators': 1,
+    'criteria': 1,
+    'ideas': 1,
+    'alternatives': 1,
+    'comments': 1,
+    'votes': 0,
+}
+
+PASSWORD = 'benchmark'
+
+def sentence(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for i in range(words))
+
+def generate(seed=0, **sizes):
+    """
+    Fills the database with a synthetic dataset of the given ``SIZES``, the
+    same for the same seed. Counters, results and search indexes are rebuilt
+    at the end. Returns the objects used by the benchmark cases, taken from
+    the last problem, which is always public and open.
+    """
+    sizes = dict(SIZES, **sizes)
+    rnd = random.Random(seed)
+    now = timezone.now()
+    ct = dict((m, ContentType.objects.get_for_model(m)) for m in [User, Problem, Criteria, Idea, Alternative, Comment])
+
+    # Users
+
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([User(username='user%05d' % i, email='user%05d@example.com' % i,
+        first_name=rnd.choice(NAMES), last_name=rnd.choice(NAMES), password=password,
+        is_active=True, date_joined=now) for i in range(sizes['users'])])
+    users = list(User.objects.filter(username__startswith='user').order_by('id').values_list('id', flat=True))
+    superuser = User.objects.create_superuser('admin', 'admin@example.com', PASSWORD)
+
+    # Problems
+
+    actions, follows = list(), list()
+    def action(user, verb, obj, problem, when):
+        actions.append(Action(actor_content_type=ct[User], actor_object_id=str(user), verb=verb,
+            action_object_content_type=ct[obj.__class__], action_object_object_id=str(obj.id),
+            target_content_type=ct[Problem], target_object_id=str(problem.id), timestamp=when,
+            data={'diff': '<p>%s</p>' % getattr(obj, 'title', getattr(obj, 'name', '')),
+                'content': '', 'edit_message': '', 'object': {'id': obj.id}, 'diff_stats': ''}))
+
+    for n in range(sizes['problems']):
+        when = now - timedelta(days=sizes['problems'] - n)
+        problem = Problem.objects.create(title=('%d %s' % (n, sentence(rnd, 4))).capitalize(),
+            description='<p>%s</p>' % sentence(rnd, 80), author_id=rnd.choice(users),
+            published=True, open=n % 3 != 0 or n == sizes['problems'] - 1,
+            public=n % 5 != 0 or n == sizes['problems'] - 1)
+        others = [u for u in users if u != problem.author_id]
+        collaborators = rnd.sample(others, max(0, min(sizes['collaborators'], len(others) - 1)))
+        problem.collaborator.add(*collaborators)
+        members = [problem.author_id] + collaborators
+        follows.extend(Follow(user_id=u, content_type=ct[Problem], object_id=str(problem.id),
+            actor_only=False, started=when) for u in members)
+        action(problem.author_id, 'created', problem, problem, when)
+
+        criteria = list()
+        for i in range(sizes['criteria']):
+            fmt, result, order = FORMATS[i % len(FORMATS)]
+            criteria.append(Criteria.objects.create(problem=problem, name='%s %d.%d' % (rnd.choice(WORDS).capitalize(), n, i),
+                description=sentence(rnd, 20), fmt=fmt, result=result, order=order, min=0, max=10,
+                weight=rnd.randint(1, 5), author_id=problem.author_id))
+            action(problem.author_id, 'created', criteria[-1], problem, when)
+
+        Idea.objects.bulk_create([Idea(problem=problem, title=sentence(rnd, 5).capitalize(),
+            description='<p>%s</p>' % sentence(rnd, 60), author_id=rnd.choice(members), published=True)
+            for i in range(sizes['ideas'])])
+        ideas = list(Idea.objects.filter(problem=problem).order_by('id'))
+        IdeaCriteria.objects.bulk_create([IdeaCriteria(idea=idea, criteria=c, description=sentence(rnd, 10),
+            value_number=rnd.randint(0, 1000), value_currency='%d.%02d' % (rnd.randint(0, 10000), rnd.randint(0, 99)),
+            value_scale=rnd.randint(0, 10), value_time=rnd.randint(0, 100), value_boolean=rnd.random() < 0.5)
+            for idea in ideas for c in criteria])
+        for idea in ideas:
+            action(idea.author_id, 'created', idea, problem, when + timedelta(minutes=rnd.randint(1, 60 * 24)))
+
+        alternatives = list()
+        for i in range(sizes['alternatives']):
+            alternatives.append(Alternative.objects.create(name=sentence(rnd, 3).capitalize(),
+                problem=problem, author_id=rnd.choice(members), order=i))
+            alternatives[-1].idea.add(*rnd.sample(ideas, min(len(ideas), rnd.randint(1, 5))))
+            action(alternatives[-1].author_id, 'created', alternatives[-1], problem, when)
+
+        targets = [('problem', problem)] + [('criteria', c) for c in criteria] + \
+            [('idea', i) for i in ideas] + [('alternative', a) for a in alternatives]
+        comments = list()
+        for i in range(sizes['comments']):
+            field, target = rnd.choice(targets)
+            comments.append(Comment(content=sentence(rnd, 25), author_id=rnd.choice(members), **{field: target}))
+        Comment.objects.bulk_create(comments)
+        for comment in Comment.objects.filter(Q(problem=problem) | Q(criteria__problem=problem) |
+            Q(idea__problem=problem) | Q(alternative__problem=problem)).order_by('id'):
+            action(comment.author_id, 'commented', comment, problem, when + timedelta(minutes=rnd.randint(1, 60 * 24)))
+
+        votes = dict()
+        for i in range(sizes['votes']):
+            if rnd.random() < 0.5 or not alternatives:
+                votes[('idea', rnd.choice(ideas).id, rnd.choice(members))] = 0
+            else:
+                votes[('alternative', rnd.choice(alternatives).id, rnd.choice(members))] = rnd.randint(0, 100)
+        Vote.objects.bulk_create([Vote(author_id=user, value=value, **{'%s_id' % kind: obj})
+            for (kind, obj, user), value in sorted(votes.items())])
+
+    Follow.objects.bulk_create(follows)
+    Action.objects.bulk_create(actions)
+
+    # Derived data
+
+    for model in counters.COUNTERS:
+        counters.reconcile(model)
+    for problem in Problem.objects.all():
+        update_results(problem)
+    user_index.rebuild()
+    search.rebuild()
+
+    problem = Problem.objects.filter(public=True, open=True).order_by('-id')[0]
+    author = problem.author
+    # The author collaborates in the other problems, so the lists of problems
+    # of the user are never empty
+    for other in Problem.objects.exclude(author=author):
+        other.collaborator.add(author)
+    collaborator = problem.collaborator.exclude(id=author.id).order_by('id')[0]
+    return {
+        'problem': problem,
+        'author': author,
+        'collaborator': collaborator,
+        'outsider': User.objects.exclude(id__in=problem.collaborator.all()).exclude(id=author.id).filter(is_superuser=False).order_by('id')[0],
+        'superuser': superuser,
+        'criteria': Criteria.objects.filter(problem=problem).order_by('id')[0],
+        'idea': Idea.objects.filter(problem=problem).order_by('id')[0],
+        'alternative': Alternative.objects.filter(problem=problem).order_by('id')[0],
+        'comment': Comment.objects.order_by('id')[0],
+        'sizes': sizes,
+    }
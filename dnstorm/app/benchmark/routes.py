@@ -0,0 +1,91 @@
+import re
+
+from django.core.urlresolvers import NoReverseMatch, RegexURLPattern, reverse
+
+from dnstorm.app import metrics
+from dnstorm.app.benchmark import ajax
+
+ROLES = ['anonymous', 'collaborator', 'author', 'superuser']
+
+# Datasets compared by ``walk``, as sizes for ``data.generate``
+SMALL = {'users': 20, 'problems': 2, 'collaborators': 3, 'criteria': 2, 'ideas': 3,
+    'alternatives': 2, 'comments': 4, 'votes': 4}
+LARGE = {'users': 60, 'problems': 5, 'collaborators': 10, 'criteria': 6, 'ideas': 15,
+    'alternatives': 6, 'comments': 15, 'votes': 20}
+
+# Read-only actions of ``AjaxView`` walked along with the routes
+AJAX = {
+    'ajax:user_search': lambda context: {'user_search': context['outsider'].first_name[:3]},
+    'ajax:help': lambda context: {'help': 1},
+}
+
+# Objects given as ``pk`` to the routes starting with their names
+OBJECTS = ['problem', 'criteria', 'idea', 'alternative', 'comment']
+
+def routes():
+    """
+    Named routes of ``dnstorm.app.urls``, leaving out the included apps and
+    the routes for the tabs of a page, which are never requested.
+    """
+    from dnstorm.app.urls import urlpatterns
+    return [p for p in urlpatterns if isinstance(p, RegexURLPattern) and p.name and '#' not in p.regex.pattern]
+
+def arguments(pattern, context):
+    """
+    Values for the groups of a route: the first choice of the groups listing
+    them, and the objects of the dataset for the others.
+    """
+    kwargs = dict()
+    for group in pattern.regex.groupindex:
+        choices = re.search(r'\(\?P<%s>([\w|]+)\)' % group, pattern.regex.pattern)
+        if choices:
+            kwargs[group] = choices.group(1).split('|')[0]
+        elif group == 'pk':
+            prefix = pattern.name.split('_')[0]
+            kwargs[group] = context[prefix if prefix in OBJECTS else 'problem'].id
+        elif group == 'slug':
+            kwargs[group] = context['problem'].slug
+        elif group == 'username':
+            kwargs[group] = context['outsider' if pattern.name in ['user_activate', 'user_inactivate'] else 'author'].username
+        elif group == 'problem':
+            kwargs[group] = context['problem'].id
+    return kwargs
+
+def count(request):
+    """
+    Queries of a request made once more after a first one to fill the caches.
+    Returns the count, or the error raised by the request.
+    """
+    try:
+        request()
+        metrics.start()
+        request()
+    except Exception as e:
+        metrics.stop(None)
+        return '%s: %s' % (e.__class__.__name__, e)
+    return metrics.stop(None)['queries']
+
+def walk(context, names=None):
+    """
+    Query counts of each route for each role, by route name and role. Errors
+    are given as strings instead of counts.
+    """
+    metrics.install()
+    requests, counts = list(), dict()
+    for pattern in routes():
+        if names and pattern.name not in names:
+            continue
+        try:
+            url = reverse(pattern.name, kwargs=arguments(pattern, context))
+        except NoReverseMatch as e:
+            counts.update(((pattern.name, role), 'NoReverseMatch: %s' % e) for role in ROLES)
+            continue
+        requests.append((pattern.name, lambda client, url=url: client.get(url)))
+    for name, params in sorted(AJAX.items()):
+        if not names or name in names:
+            requests.append((name, lambda client, params=params(context): ajax(client, **params)))
+
+    for name, request in requests:
+        for role in ROLES:
+            counts[(name, role)] = count(lambda: request(context['clients'][role]))
+    return counts
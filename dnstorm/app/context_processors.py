@@ -3,32 +3,72 @@ from django.core.urlresolvers import reverse
 
 from actstream.models import user_stream
 
+from dnstorm import settings
 from dnstorm.app import DNSTORM_URL
-from dnstorm.app.utils import get_option
 from dnstorm.app.models import Problem, Idea
-from dnstorm.app.utils import get_option
+from dnstorm.app.utils import activity_counter, get_options, load_actions
+
+class LazyContext(dict):
+    """
+    Context with values given by functions, which are called only when a
+    template reads the value and just once.
+    """
+
+    def __init__(self, values, functions):
+        super(LazyContext, self).__init__(values)
+        self.update(dict.fromkeys(functions))
+        self.functions = functions
+
+    def __getitem__(self, key):
+        if key in self.functions:
+            self[key] = self.functions.pop(key)()
+        return super(LazyContext, self).__getitem__(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def values(self):
+        return [self[key] for key in self]
+
+def skip(request):
+    """
+    Requests that never render the pages using the ``base`` variables.
+    """
+    return any(request.path.startswith(p) for p in [settings.STATIC_URL, settings.MEDIA_URL,
+        reverse('ajax'), reverse('stream'), reverse('jsi18n')])
 
 def base(request):
     """
-    Provides basic variables used for all templates.
+    Provides basic variables used for all templates. They are evaluated when
+    first used and kept for the request.
     """
-    context = dict()
-    context['dnstorm_url'] = DNSTORM_URL
-
-    # Links
-    if not context.get('site_title', None):
-        context['site_title'] = '%s | %s' % (
-            get_option('site_title'), get_option('site_description'))
-    context['site_url'] = get_option('site_url')
-    context['login_form'] = AuthenticationForm()
-    context['login_url'] = reverse('login') + '?next=' + request.build_absolute_uri() if 'next' not in request.GET else ''
-    context['logout_url'] = reverse('logout') + '?next=' + request.build_absolute_uri() if 'next' not in request.GET else ''
-
-    # Checks
-    context['is_update'] = 'update' in request.resolver_match.url_name
-
-    # Activity
-    context['user_activity'] = user_stream(request.user, with_user_activity=True) if request.user.is_authenticated() else None
-    context['user_activity_counter'] = get_option('user_%d_activity_counter' % request.user.id) if request.user.is_authenticated() else None
-
-    return context
+    if skip(request):
+        return dict()
+    if hasattr(request, '_base_context'):
+        return request._base_context
+
+    options = dict()
+    def option(name):
+        if not options:
+            options.update(get_options('site_title', 'site_description', 'site_url'))
+        return options[name]
+
+    request._base_context = LazyContext({'dnstorm_url': DNSTORM_URL}, {
+        # Links
+        'site_title': lambda: '%s | %s' % (option('site_title'), option('site_description')),
+        'site_url': lambda: option('site_url'),
+        'login_form': AuthenticationForm,
+        'login_url': lambda: reverse('login') + '?next=' + request.build_absolute_uri() if 'next' not in request.GET else '',
+        'logout_url': lambda: reverse('logout') + '?next=' + request.build_absolute_uri() if 'next' not in request.GET else '',
+        # Checks
+        'is_update': lambda: 'update' in request.resolver_match.url_name,
+        # Activity
+        'user_activity': lambda: load_actions(user_stream(request.user, with_user_activity=True).select_related(
+            'actor_content_type', 'target_content_type', 'action_object_content_type')[
+            :settings.DNSTORM.get('activity_box_size', 10)]) if request.user.is_authenticated() else None,
+        'user_activity_counter': lambda: activity_counter(request.user) if request.user.is_authenticated() else None,
+    })
+    return request._base_context
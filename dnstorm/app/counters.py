@@ -0,0 +1,129 @@
+from django.db.models import Count, F, Q, Sum
+
+from dnstorm.app.models import Alternative, Comment, Criteria, Idea, Problem, UserStats, Vote
+
+# Counter fields of each model with the objects they aggregate: field, model
+# aggregated, filters, lookup to the counted object and aggregate. Fields
+# listed more than once are the sum of their aggregates.
+COUNTERS = {
+    Problem: [
+        ('idea_count', Idea, {'published': True}, 'problem', Count('id')),
+        ('criteria_count', Criteria, {}, 'problem', Count('id')),
+        ('alternative_count', Alternative, {}, 'problem', Count('id')),
+        ('comment_count', Comment, {}, 'problem', Count('id')),
+        ('comment_count', Comment, {}, 'criteria__problem', Count('id')),
+        ('comment_count', Comment, {}, 'idea__problem', Count('id')),
+        ('comment_count', Comment, {}, 'alternative__problem', Count('id')),
+    ],
+    Idea: [
+        ('vote_count', Vote, {}, 'idea', Count('id')),
+        ('comment_count', Comment, {}, 'idea', Count('id')),
+    ],
+    Alternative: [
+        ('vote_count', Vote, {}, 'alternative', Count('id')),
+        ('vote_sum', Vote, {}, 'alternative', Sum('value')),
+        ('comment_count', Comment, {}, 'alternative', Count('id')),
+    ],
+    UserStats: [
+        ('problem_count', Problem, {'published': True}, 'author', Count('id')),
+        ('idea_count', Idea, {'published': True}, 'author', Count('id')),
+        ('comment_count', Comment, {}, 'author', Count('id')),
+    ],
+}
+
+# Field of the models identifying the counted object when it's not the
+# object itself. Missing rows of these models get created on reconcile.
+KEYS = {
+    UserStats: 'user',
+}
+
+def fields(model):
+    return sorted(set(c[0] for c in COUNTERS[model]))
+
+def increment(obj, **deltas):
+    """
+    Adds the given deltas to the counters of the object in a single atomic
+    update and reloads their values into the object.
+    """
+    deltas = dict((f, d) for f, d in deltas.items() if d)
+    if not deltas:
+        return
+    model = obj.__class__
+    model.objects.filter(id=obj.id).update(**dict((f, F(f) + d) for f, d in deltas.items()))
+    for f, v in model.objects.filter(id=obj.id).values(*deltas.keys())[0].items():
+        setattr(obj, f, v)
+
+def count(model, ids=None):
+    """
+    Actual values of the counters for the objects of the model with the given
+    ids, or for all of them, with one grouped query per aggregate. Objects
+    without anything to count are left out.
+    """
+    counters = dict()
+    for field, source, filters, lookup, aggregate in COUNTERS[model]:
+        qs = source.objects.filter(**filters)
+        if ids is not None:
+            qs = qs.filter(**{'%s__in' % lookup: ids})
+        else:
+            qs = qs.filter(**{'%s__isnull' % lookup: False})
+        for row in qs.values(lookup).annotate(value=aggregate).order_by():
+            c = counters.setdefault(row[lookup], dict.fromkeys(fields(model), 0))
+            c[field] += row['value'] or 0
+    return counters
+
+def reconcile(model, ids=None, commit=True):
+    """
+    Compares the stored counters of the objects with their actual values and
+    updates the drifted ones. Returns the ids of the drifted objects, which
+    are the values of the ``KEYS`` field for the models listed there.
+    """
+    key = KEYS.get(model, 'id')
+    names = fields(model)
+    actual = count(model, ids)
+    stored = model.objects.all() if ids is None else model.objects.filter(**{'%s__in' % key: ids})
+    drifted = list()
+    for row in stored.values(key, *names).order_by(key).iterator():
+        values = actual.pop(row[key], dict.fromkeys(names, 0))
+        if any(row[n] != values[n] for n in names):
+            drifted.append(row[key])
+            if commit:
+                model.objects.filter(**{key: row[key]}).update(**values)
+    if key != 'id' and actual:
+        drifted.extend(sorted(actual))
+        if commit:
+            model.objects.bulk_create([model(**dict(values, **{'%s_id' % key: k})) for k, values in actual.items()])
+    return drifted
+
+def update(obj):
+    """
+    Recomputes the counters of a single object, for changes that can't be
+    given as deltas to ``increment`` like deletions in cascade.
+    """
+    reconcile(obj.__class__, [obj.id])
+    for f, v in obj.__class__.objects.filter(id=obj.id).values(*fields(obj.__class__))[0].items():
+        setattr(obj, f, v)
+
+def increment_user(user, **deltas):
+    """
+    Adds the given deltas to the ``UserStats`` of the user, creating it with
+    the actual values when it doesn't exist yet.
+    """
+    deltas = dict((f, d) for f, d in deltas.items() if d)
+    if deltas and not UserStats.objects.filter(user=user).update(**dict((f, F(f) + d) for f, d in deltas.items())):
+        reconcile(UserStats, [getattr(user, 'id', user)])
+
+def contributors(obj):
+    """
+    Ids of the users whose ``UserStats`` change when the object is deleted
+    along with its related objects.
+    """
+    if isinstance(obj, Problem):
+        comments = Comment.objects.filter(Q(problem=obj) | Q(criteria__problem=obj) |
+            Q(idea__problem=obj) | Q(alternative__problem=obj))
+        users = set(Idea.objects.filter(problem=obj).values_list('author', flat=True))
+    else:
+        comments = Comment.objects.filter(**{obj.__class__.__name__.lower(): obj})
+        users = set()
+    users.update(comments.values_list('author', flat=True))
+    users.add(obj.author_id)
+    return sorted(users)
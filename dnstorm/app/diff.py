@@ -0,0 +1,80 @@
+import difflib
+import hashlib
+import logging
+import re
+import time
+
+from django.core.cache import cache
+
+from dnstorm import settings
+
+logger = logging.getLogger('dnstorm.diff')
+
+BLOCK_TAGS = re.compile(r'(<(?:p|div|h[1-6]|ul|ol|li|blockquote|table|tr)[\s>])', re.I)
+
+def blocks(html):
+    """
+    Splits HTML in lines and before the opening of block elements.
+    """
+    return [b for b in BLOCK_TAGS.sub(r'\n\1', html).split('\n') if b.strip()]
+
+def content_hash(content):
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+def block_diff(old, new):
+    """
+    Cheaper diff made over blocks of HTML instead of words. Removed blocks are
+    wrapped in ``del`` and inserted blocks in ``ins`` tags, the same ones
+    produced by ``lxml.html.diff.htmldiff``.
+    """
+    old, new = blocks(old), blocks(new)
+    html = list()
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if op == 'equal':
+            html.extend(new[j1:j2])
+            continue
+        if op in ['delete', 'replace']:
+            html.extend('<del>%s</del>' % b for b in old[i1:i2])
+        if op in ['insert', 'replace']:
+            html.extend('<ins>%s</ins>' % b for b in new[j1:j2])
+    return '\n'.join(html)
+
+def html_diff(old, new, klass=''):
+    """
+    Diff between two rendered versions of an object. Unchanged contents are
+    returned right away, without hashing or looking up the cache. Diffs are
+    cached by the hashes of both versions, and contents bigger than the
+    ``diff_max_size`` setting get a ``block_diff`` instead of the word by
+    word ``htmldiff``.
+
+    Returns the diff and a dict with the ``time`` spent in milliseconds, the
+    ``size`` of the compared contents and the ``method`` used, which is also
+    logged in the ``dnstorm.diff`` logger.
+    """
+    from lxml.html.diff import htmldiff
+
+    stats = {'size': len(old) + len(new), 'time': 0}
+    if old == new:
+        stats['method'] = 'unchanged'
+        logger.info('unchanged diff of %s: %d chars', klass or 'object', stats['size'])
+        return new, stats
+
+    start = time.time()
+    key = '%s_diff_%s_%s' % (settings.DNSTORM['table_prefix'], content_hash(old), content_hash(new))
+    diff = cache.get(key)
+    if diff is not None:
+        stats['method'] = 'cached'
+    elif stats['size'] > settings.DNSTORM.get('diff_max_size', 20000):
+        stats['method'] = 'block'
+        diff = block_diff(old, new)
+    else:
+        stats['method'] = 'htmldiff'
+        diff = htmldiff(old, new)
+    if stats['method'] != 'cached':
+        cache.set(key, diff, settings.DNSTORM.get('diff_cache_timeout', 60 * 60 * 24))
+
+    stats['time'] = round((time.time() - start) * 1000, 2)
+    logger.info('%s diff of %s: %d chars in %.2fms', stats['method'], klass or 'object', stats['size'], stats['time'])
+    return diff, stats
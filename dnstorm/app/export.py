@@ -0,0 +1,151 @@
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from collections import OrderedDict
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, Sum
+
+from dnstorm import settings
+from dnstorm.app.models import Alternative, Problem, Vote
+from dnstorm.app.results import StrategyTable
+
+# Columns of the exported rows. Each alternative has a row with its result
+# for each criteria, without an idea, followed by the values of its ideas.
+COLUMNS = ['problem', 'problem_title', 'alternative', 'alternative_name',
+    'alternative_votes', 'alternative_vote_average', 'criteria', 'criteria_name',
+    'criteria_format', 'criteria_result', 'idea', 'idea_title', 'value']
+
+def rows(problems, batch_size=None):
+    """
+    Rows of the strategy tables of the problems in ``COLUMNS`` order. The
+    problems are loaded in batches of the ``export_batch_size`` setting,
+    with one query for each relation of a batch. The vote average is the one
+    of the problem page, counting only the votes given with a value.
+    """
+    batch_size = batch_size or settings.DNSTORM.get('export_batch_size', 100)
+    ids = list(problems.order_by('id').values_list('id', flat=True))
+    for n in range(0, len(ids), batch_size):
+        batch = list(Problem.objects.filter(id__in=ids[n:n + batch_size]).only('id', 'title').order_by('id'))
+        tables = StrategyTable.for_problems(batch)
+        alternatives = dict()
+        for a in Alternative.objects.filter(problem__in=batch).order_by('name', 'id'):
+            alternatives.setdefault(a.problem_id, list()).append(a)
+        votes = dict((v['alternative'], v) for v in Vote.objects.filter(
+            alternative__problem__in=batch, value__isnull=False).values('alternative')
+            .annotate(total=Sum('value'), count=Count('value')).order_by())
+        for problem in batch:
+            table = tables[problem.id]
+            for a in alternatives.get(problem.id, list()):
+                idea_ids = table.alternative_ideas.get(a.id, list())
+                v = votes.get(a.id, None)
+                average = int(float(v['total']) / v['count']) if v and v['total'] else 0
+                for c in table.criteria:
+                    head = [problem.id, problem.title, a.id, a.name, a.vote_count, average,
+                        c.id, c.name, c.fmt, c.result]
+                    yield head + [None, None, table.result(c, idea_ids)]
+                    for i in idea_ids:
+                        yield head + [i, table.ideas[i].title, table.value(i, c.id)]
+
+class Echo(object):
+    """
+    File-like object returning what is written, for ``csv.writer`` to
+    format a single row.
+    """
+
+    def write(self, value):
+        return value
+
+def encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return '' if value is None else value
+
+def to_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([encode(v) for v in row])
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(OrderedDict(zip(COLUMNS, row)), default=float) + '\n'
+
+INVALID_XML = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_PARTS = {
+    '[Content_Types].xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    'xl/workbook.xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Strategy tables" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    'xl/_rels/workbook.xml.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>',
+}
+
+def xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, long, float, Decimal)) and not isinstance(value, bool):
+        return '<c><v>%s</v></c>' % value
+    return '<c t="inlineStr"><is><t>%s</t></is></c>' % escape(INVALID_XML.sub(u'', unicode(value))).encode('utf-8')
+
+def to_xlsx(rows, chunk_size=64 * 1024):
+    """
+    Writes the rows to a worksheet in a temporary file, as the workbook can
+    only be zipped after the whole sheet is written, and yields the workbook
+    in chunks. Unlike the other formats the whole export is buffered on disk
+    before the first chunk is sent; CSV and NDJSON are the streamed ones for
+    large exports.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        sheet = os.path.join(directory, 'sheet1.xml')
+        with open(sheet, 'wb') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            f.write('<row>%s</row>' % ''.join(xlsx_cell(c) for c in COLUMNS))
+            for row in rows:
+                f.write('<row>%s</row>' % ''.join(xlsx_cell(v) for v in row))
+            f.write('</sheetData></worksheet>')
+        workbook = os.path.join(directory, 'workbook.xlsx')
+        with zipfile.ZipFile(workbook, 'w', zipfile.ZIP_DEFLATED) as z:
+            for name, content in sorted(XLSX_PARTS.items()):
+                z.writestr(name, content)
+            z.write(sheet, 'xl/worksheets/sheet1.xml')
+        os.remove(sheet)
+        with open(workbook, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), ''):
+                yield chunk
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# Output of each format: function, content type and file extension
+FORMATS = {
+    'csv': (to_csv, 'text/csv; charset=utf-8', 'csv'),
+    'ndjson': (to_ndjson, 'application/x-ndjson', 'ndjson'),
+    'xlsx': (to_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+def export(problems, fmt):
+    """
+    Generator of the strategy tables of the problems in the given format.
+    """
+    return FORMATS[fmt][0](rows(problems))
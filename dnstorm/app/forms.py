@@ -11,7 +11,6 @@ from django.core.urlresolvers import reverse
 from django.core.validators import MinValueValidator
 from django.http import Http404, QueryDict, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext as _
 
@@ -20,7 +19,7 @@ from crispy_forms_foundation.layout import *
 from crispy_forms.utils import render_crispy_form
 from registration.forms import RegistrationFormUniqueEmail
 
-from dnstorm.app import models
+from dnstorm.app import fragments, loaders, models
 from dnstorm.app.utils import get_object_or_none, get_option
 from dnstorm.settings import LANGUAGES
 
@@ -102,6 +101,36 @@ class OptionsForm(forms.Form):
             raise forms.ValidationError(_('Wrong domain format.'))
         return self.cleaned_data['site_url']
 
+class ImportForm(forms.Form):
+    file = forms.FileField(label=_('File'), help_text=_('CSV or JSON file with the problems, criteria and ideas to import.'))
+    format = forms.ChoiceField(label=_('Format'), required=False, choices=(
+        ('', _('By the file extension')),
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+    ))
+
+    def __init__(self, *args, **kwargs):
+        self.helper = FormHelper()
+        self.helper.form_action = '.'
+        self.helper.layout = Layout(
+            Fieldset(_('Import'),
+                'file',
+                'format',
+            ),
+            ButtonHolder(
+                Submit('submit', _('Import'), css_class='right radius'),
+            ),
+        )
+        super(ImportForm, self).__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super(ImportForm, self).clean()
+        if 'file' in cleaned_data and not cleaned_data.get('format'):
+            cleaned_data['format'] = cleaned_data['file'].name.rsplit('.', 1)[-1].lower()
+            if cleaned_data['format'] not in ['csv', 'json']:
+                raise forms.ValidationError(_('Choose the format of the file.'))
+        return cleaned_data
+
 class UserForm(forms.ModelForm):
     user_id = forms.IntegerField('user_id', widget=forms.HiddenInput())
 
@@ -225,7 +254,7 @@ class ProblemCollaboratorsForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         self.problem = kwargs.pop('problem')
-        users_html = ''.join([render_to_string('item_user_collaborator.html', {'users': self.problem.collaborator.order_by('first_name')})])
+        users_html = ''.join([fragments.render('item_user_collaborator.html', {'users': self.problem.collaborator.order_by('first_name')})])
         super(ProblemCollaboratorsForm, self).__init__(*args, **kwargs)
         self.helper = FormHelper()
         self.helper.layout = Layout(
@@ -290,7 +319,7 @@ class IdeaForm(forms.ModelForm):
             layout_args += (
                 HTML('<hr/>'),
                 Row(
-                    Column(HTML(render_to_string('item_criteria.html', {
+                    Column(HTML(fragments.render('item_criteria.html', {
                         'criteria': c, 'show_actions': False, 'show_parameters': True,
                         'show_description': True, 'show_icons': True})), css_class='large-6'),
                     Column(*_argfields, **_kwargfields),
@@ -349,10 +378,10 @@ class AlternativeForm(forms.ModelForm):
             'name',
             HTML('<h4>' + _('Select the ideas for this alternative') + '</h4>'))
         current_ideas = kwargs['instance'].idea.all()
-        for i in kwargs.get('instance', None).problem.idea_set.filter(published=True):
-            i.get_data()
+        ideas = loaders.ProblemLoader(kwargs['instance'].problem).ideas
+        for i in sorted(ideas, key=lambda i: i.id):
             layout_args += (Row(
-                Column(HTML(render_to_string('item_idea.html', {
+                Column(HTML(fragments.render('item_idea.html', {
                     'idea': i, 'show_check': True, 'show_likes': False, 'show_actions': False,
                     'show_comments': False, 'checked': i in current_ideas})),
                     css_class='large-12'), css_class='collapse'),)
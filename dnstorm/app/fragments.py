@@ -0,0 +1,148 @@
+import hashlib
+import re
+import uuid
+
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import signals
+from django.template import Context, TextNode
+from django.template.loader import get_template
+from django.template.loader_tags import ConstantIncludeNode
+from django.contrib.humanize.templatetags.humanize import naturaltime
+from django.utils import translation
+from django.utils.dateparse import parse_datetime
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from dnstorm import settings
+
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+# Compiled and minified item templates by name, and the variables given to
+# all of them when rendered by ``render``.
+TEMPLATES = dict()
+BASE_CONTEXT = {'STATIC_URL': settings.STATIC_URL, 'MEDIA_URL': settings.MEDIA_URL}
+
+# Markers left in the cached fragments for the dates rendered by ``fill``
+LIVE = re.compile(r'<!--naturaltime:(\S+?)-->')
+
+def version_key(name, pk):
+    return '%s_fragment_version_%s_%s' % (settings.DNSTORM['table_prefix'], name, pk)
+
+def cache_key(key, vary_on=None):
+    """
+    Cache key of a rendered fragment for the ``fragment_key`` of an object,
+    the values it varies on and the active language.
+    """
+    args = ':'.join(unicode(v) for v in [key, translation.get_language()] + list(vary_on or []))
+    return '%s_fragment_%s' % (settings.DNSTORM['table_prefix'], hashlib.md5(args.encode('utf-8')).hexdigest())
+
+def bump(*objs):
+    """
+    Gives the objects, given as ``(name, id)`` tuples, a new content version
+    so their cached fragments are not used anymore.
+    """
+    cache.set_many(dict((version_key(name, pk), uuid.uuid4().hex)
+        for name, pk in objs if pk), VERSION_TIMEOUT)
+
+def versions(objs):
+    """
+    Content versions of the objects fetched at once, creating the missing
+    ones. Returns a dict of versions by class name and id.
+    """
+    keys = dict(((o.__class__.__name__.lower(), o.pk), version_key(o.__class__.__name__.lower(), o.pk)) for o in objs)
+    stored = cache.get_many(keys.values())
+    missing = dict((key, uuid.uuid4().hex) for key in keys.values() if key not in stored)
+    if missing:
+        cache.set_many(missing, VERSION_TIMEOUT)
+        stored.update(missing)
+    return dict((k, stored[key]) for k, key in keys.items())
+
+def prepare(problem, objs, roles):
+    """
+    Sets the ``fragment_key`` of the objects of a problem to be used by the
+    ``fragment`` template tag. The key changes with the content version of
+    the object and of its problem, and with the role of the user given in
+    the ``roles`` dict by object, as the permission flags and the votes of
+    the user are rendered in the fragments.
+    """
+    objs = list(objs)
+    v = versions([problem] + objs)
+    for o in objs:
+        name = o.__class__.__name__.lower()
+        o.fragment_key = '%s-%d-%s-%s-%s' % (name, o.pk, v[(name, o.pk)], v[('problem', problem.pk)], roles.get(o, ''))
+
+def live(date):
+    """
+    Marker of a date to be rendered by ``fill`` every time a cached fragment
+    is used, as its relative date changes without a new version.
+    """
+    return '<!--naturaltime:%s-->' % date.isoformat()
+
+def fill(html):
+    """
+    Renders the relative dates of the markers left in a fragment by ``live``.
+    """
+    return mark_safe(LIVE.sub(lambda m: escape(naturaltime(parse_datetime(m.group(1)))), html))
+
+def minify(template):
+    """
+    Removes the line breaks and indentation from the text nodes of a compiled
+    template and of the templates it includes, so they are rendered without
+    them instead of being stripped from the output on every render.
+    """
+    for node in template.nodelist.get_nodes_by_type(TextNode):
+        node.s = re.sub(r'\s*\n\s*', ' ', re.sub(r'>\s*\n\s*<', '><', node.s))
+    for node in template.nodelist.get_nodes_by_type(ConstantIncludeNode):
+        if node.template:
+            minify(node.template)
+    return template
+
+def render(name, context=None):
+    """
+    Renders an item template for AJAX responses and forms. The template is
+    compiled and minified once per process, or on every call with ``DEBUG``
+    so changes are seen right away.
+    """
+    template = TEMPLATES.get(name)
+    if not template:
+        template = minify(get_template(name))
+        if not settings.DEBUG:
+            TEMPLATES[name] = template
+    c = Context(BASE_CONTEXT)
+    c.update(context or {})
+    return template.render(c)
+
+def invalidate(sender, instance, **kwargs):
+    """
+    Bumps the versions of the fragments affected by a saved or deleted object.
+    Changes of criteria, ideas and their values are shown across all the
+    items of the problem, so they bump the version of the problem.
+    """
+    name = sender.__name__ if sender._meta.app_label == 'app' else None
+    if name in ['Problem']:
+        bump(('problem', instance.pk))
+    elif name in ['Criteria', 'Idea']:
+        bump(('problem', instance.problem_id))
+    elif name in ['IdeaCriteria']:
+        try:
+            bump(('problem', instance.idea.problem_id))
+        except ObjectDoesNotExist:
+            pass
+    elif name in ['Alternative']:
+        bump(('alternative', instance.pk))
+    elif name in ['Comment', 'Vote']:
+        bump(*[(f, getattr(instance, '%s_id' % f)) for f in ['criteria', 'idea', 'alternative']
+            if hasattr(instance, '%s_id' % f)])
+
+def invalidate_m2m(sender, instance, action, **kwargs):
+    """
+    Bumps the version of objects getting coauthors or ideas.
+    """
+    if action in ['post_add', 'post_remove', 'post_clear'] and \
+        instance.__class__.__name__ in ['Criteria', 'Idea', 'Alternative']:
+        bump((instance.__class__.__name__.lower(), instance.pk))
+
+signals.post_save.connect(invalidate, dispatch_uid='dnstorm_fragments_save')
+signals.post_delete.connect(invalidate, dispatch_uid='dnstorm_fragments_delete')
+signals.m2m_changed.connect(invalidate_m2m, dispatch_uid='dnstorm_fragments_m2m')
@@ -0,0 +1,295 @@
+import csv
+import json
+from collections import OrderedDict
+
+from django import forms
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, router, transaction
+from django.db.models import AutoField, Q
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.translation import ugettext as _
+
+from actstream import action
+from actstream.models import Follow
+from autoslug.utils import crop_slug
+
+from dnstorm.app import counters, search
+from dnstorm.app.models import Criteria, Idea, IdeaCriteria, Problem, UserStats
+
+# Fields cleaning the values of the ideas for each criteria format, the same
+# as the ones of ``IdeaForm``.
+VALUE_FIELDS = {
+    'number': forms.IntegerField(),
+    'scale': forms.IntegerField(),
+    'time': forms.IntegerField(),
+    'currency': forms.DecimalField(max_digits=10, decimal_places=2),
+    'boolean': forms.BooleanField(required=False),
+}
+
+# Columns of the CSV files. The ``kind`` of each row tells which of the
+# other columns are read:
+#  * ``problem``: problem, description
+#  * ``criteria``: problem, criteria, description, fmt, min, max, order, weight, result
+#  * ``idea``: problem, idea, description
+#  * ``value``: problem, idea, criteria, value, description
+CSV_COLUMNS = ['kind', 'problem', 'criteria', 'idea', 'description', 'value',
+    'fmt', 'min', 'max', 'order', 'weight', 'result']
+
+MAX_ERRORS = 50
+
+class InvalidImport(ValueError):
+    """
+    Raised with the list of ``errors`` found in the imported data.
+    """
+
+    def __init__(self, errors):
+        super(InvalidImport, self).__init__('\n'.join(errors))
+        self.errors = errors
+
+def parse_json(f):
+    """
+    Problems of a JSON list like ``[{"title", "description", "criteria":
+    [{"name", "description", "fmt", "min", "max", "order", "weight",
+    "result"}], "ideas": [{"title", "description", "values": {"<criteria
+    name>": {"value", "description"}}}]}]``.
+    """
+    try:
+        data = json.load(f)
+    except ValueError as e:
+        raise InvalidImport([_('Invalid JSON: %s') % e])
+    if isinstance(data, dict):
+        data = data.get('problems', list())
+    if not isinstance(data, list) or not all(isinstance(p, dict) for p in data):
+        raise InvalidImport([_('The JSON must be a list of problems.')])
+    for n, p in enumerate(data):
+        p['where'] = _('problem %d') % (n + 1)
+        for m, c in enumerate(p.get('criteria') or list()):
+            c['where'] = _('criteria %(n)d of problem %(p)d') % {'n': m + 1, 'p': n + 1}
+        for m, i in enumerate(p.get('ideas') or list()):
+            i['where'] = _('idea %(n)d of problem %(p)d') % {'n': m + 1, 'p': n + 1}
+    return data
+
+def parse_csv(f):
+    """
+    Problems of a CSV file with the ``CSV_COLUMNS``, in the structure given
+    by ``parse_json``.
+    """
+    problems, errors = OrderedDict(), list()
+    reader = csv.DictReader(f)
+    for row in reader:
+        row = dict((k, (v or '').decode('utf-8').strip()) for k, v in row.items() if k)
+        where = _('line %d') % reader.line_num
+        problem = problems.get(row.get('problem'))
+        if row.get('kind') == 'problem':
+            problems[row.get('problem')] = {'title': row.get('problem'), 'description': row.get('description'),
+                'criteria': list(), 'ideas': OrderedDict(), 'where': where}
+        elif row.get('kind') not in ['criteria', 'idea', 'value']:
+            errors.append(_('%s: unknown kind "%s".') % (where, row.get('kind')))
+        elif not problem:
+            errors.append(_('%s: the problem "%s" must be given before.') % (where, row.get('problem')))
+        elif row['kind'] == 'criteria':
+            problem['criteria'].append(dict([('name', row.get('criteria')), ('where', where)] +
+                [(k, row.get(k) or None) for k in ['description', 'fmt', 'min', 'max', 'order', 'weight', 'result']]))
+        elif row['kind'] == 'idea':
+            problem['ideas'][row.get('idea')] = {'title': row.get('idea'), 'description': row.get('description'),
+                'values': dict(), 'where': where}
+        elif row.get('idea') not in problem['ideas']:
+            errors.append(_('%s: the idea "%s" must be given before.') % (where, row.get('idea')))
+        else:
+            problem['ideas'][row['idea']]['values'][row.get('criteria')] = {
+                'value': row.get('value'), 'description': row.get('description')}
+    if errors:
+        raise InvalidImport(errors)
+    for p in problems.values():
+        p['ideas'] = p['ideas'].values()
+    return problems.values()
+
+def parse(f, fmt):
+    return {'csv': parse_csv, 'json': parse_json}[fmt](f)
+
+def required(obj, field, errors, max_length=None):
+    value = obj.get(field)
+    value = unicode(value).strip() if value is not None else ''
+    if not value:
+        errors.append(_('%(where)s: %(field)s is required.') % {'where': obj['where'], 'field': field})
+    elif max_length and len(value) > max_length:
+        errors.append(_('%(where)s: %(field)s is longer than %(max)d characters.') % {
+            'where': obj['where'], 'field': field, 'max': max_length})
+    return value
+
+def choice(obj, field, model, errors, default=None):
+    value = obj.get(field) or default
+    choices = [c[0] for c in model._meta.get_field(field).choices]
+    if value not in choices:
+        errors.append(_('%(where)s: %(field)s must be one of %(choices)s.') % {
+            'where': obj['where'], 'field': field, 'choices': ', '.join(choices)})
+    return value
+
+def integer(obj, field, errors):
+    if obj.get(field) in [None, '']:
+        return None
+    try:
+        return int(obj[field])
+    except (TypeError, ValueError):
+        errors.append(_('%(where)s: %(field)s must be an integer.') % {'where': obj['where'], 'field': field})
+
+def validate(problems, user):
+    """
+    Unsaved objects of the parsed problems, as a list of ``(problem,
+    criteria, ideas)`` with a list of ``(idea, values)`` as ideas. Criteria
+    are checked like ``CriteriaForm`` and the values of the ideas like
+    ``IdeaForm`` and ``IdeaUpdateView``. Raises ``InvalidImport`` with the
+    errors found.
+    """
+    now = timezone.now()
+    objects, errors = list(), list()
+    for p in problems:
+        problem = Problem(title=required(p, 'title', errors, 90), description=required(p, 'description', errors),
+            author=user, published=True, open=bool(p.get('open', True)), public=bool(p.get('public', True)),
+            created=now, updated=now, last_activity=now)
+
+        criteria = OrderedDict()
+        for c in p.get('criteria') or list():
+            obj = Criteria(name=required(c, 'name', errors, 90), description=required(c, 'description', errors),
+                fmt=choice(c, 'fmt', Criteria, errors, 'number'), order=choice(c, 'order', Criteria, errors, 'asc'),
+                result=choice(c, 'result', Criteria, errors, 'sum'), weight=integer(c, 'weight', errors),
+                min=integer(c, 'min', errors), max=integer(c, 'max', errors), author=user, created=now, updated=now)
+            if obj.fmt == 'scale' and (obj.min is None or obj.max is None):
+                errors.append(_('%s: minimum and maximum scale required for this format.') % c['where'])
+            if obj.weight is not None and obj.weight < 0:
+                errors.append(_('%s: weight must be positive.') % c['where'])
+            if obj.name in criteria:
+                errors.append(_('%(where)s: repeated criteria "%(name)s".') % {'where': c['where'], 'name': obj.name})
+            criteria[obj.name] = obj
+
+        ideas = list()
+        for i in p.get('ideas') or list():
+            idea = Idea(title=required(i, 'title', errors, 90), description=required(i, 'description', errors),
+                author=user, published=True)
+            values = list()
+            given = i.get('values') or dict()
+            for name in given:
+                if name not in criteria:
+                    errors.append(_('%(where)s: unknown criteria "%(name)s".') % {'where': i['where'], 'name': name})
+            for name, c in criteria.items():
+                v = dict(given.get(name) or dict(), where='%s, %s' % (i['where'], name))
+                ic = IdeaCriteria(criteria=c, description=required(v, 'description', errors))
+                if c.fmt not in VALUE_FIELDS:
+                    continue
+                try:
+                    value = VALUE_FIELDS[c.fmt].clean(v.get('value'))
+                except forms.ValidationError as e:
+                    errors.append('%s: %s' % (v['where'], ' '.join(e.messages)))
+                    continue
+                if c.fmt == 'scale' and c.min is not None and c.max is not None and not c.min <= value <= c.max:
+                    errors.append(_('%s: provide a value within the specified range.') % v['where'])
+                setattr(ic, 'value_%s' % c.fmt, value)
+                values.append(ic)
+            ideas.append((idea, values))
+
+        objects.append((problem, criteria.values(), ideas))
+        if len(errors) >= MAX_ERRORS:
+            break
+    if errors:
+        raise InvalidImport(errors[:MAX_ERRORS])
+    return objects
+
+def slugs(model, values):
+    """
+    Unique slugs for new objects of the model made from the given values,
+    the same generated by their ``AutoSlugField``, with one query for each
+    hundred of them to find the slugs already taken.
+    """
+    field = model._meta.get_field('slug')
+    bases = [crop_slug(field, field.slugify(v)) or model._meta.module_name for v in values]
+    taken = set()
+    prefixes = sorted(set(b[:field.max_length - 4] for b in bases))
+    for n in range(0, len(prefixes), 100):
+        q = Q()
+        for prefix in prefixes[n:n + 100]:
+            q |= Q(slug__startswith=prefix)
+        taken.update(model.objects.filter(q).values_list('slug', flat=True))
+    result = list()
+    for base in bases:
+        slug, index = base, 1
+        while slug in taken:
+            index += 1
+            tail = '%s%d' % (field.index_sep, index)
+            slug = base[:field.max_length - len(tail)] + tail
+        taken.add(slug)
+        result.append(slug)
+    return result
+
+def insert(model, objs):
+    """
+    Inserts the objects with their values as they are, without the
+    ``pre_save`` of the fields generating a unique slug with a query for
+    each object. Sets their ids read back by slug.
+    """
+    fields = [f for f in model._meta.local_fields if not isinstance(f, AutoField)]
+    size = max(1, connection.ops.bulk_batch_size(fields, objs))
+    for n in range(0, len(objs), size):
+        model._base_manager._insert(objs[n:n + size], fields=fields, using=router.db_for_write(model), raw=True)
+    ids = dict()
+    slugs = [o.slug for o in objs]
+    for n in range(0, len(slugs), 500):
+        ids.update(model.objects.filter(slug__in=slugs[n:n + 500]).values_list('slug', 'id'))
+    for o in objs:
+        o.id = ids[o.slug]
+
+def save(objects, user):
+    """
+    Saves the validated objects in a single transaction with a few bulk
+    inserts, registering a single activity for the import. Returns the
+    number of problems, criteria and ideas created.
+    """
+    problems = [p for p, criteria, ideas in objects]
+    with transaction.commit_on_success():
+        for p, slug in zip(problems, slugs(Problem, [p.title for p in problems])):
+            p.slug = slug
+        insert(Problem, problems)
+
+        criteria = list()
+        for p, cs, ideas in objects:
+            for c in cs:
+                c.problem_id = p.id
+                criteria.append(c)
+        for c, slug in zip(criteria, slugs(Criteria, [c.name for c in criteria])):
+            c.slug = slug
+        insert(Criteria, criteria)
+
+        ideas = list()
+        for p, cs, idea_values in objects:
+            for idea, values in idea_values:
+                idea.problem_id = p.id
+                ideas.append(idea)
+        Idea.objects.bulk_create(ideas)
+        ids = dict()
+        for i, p in Idea.objects.filter(problem__in=problems).order_by('id').values_list('id', 'problem'):
+            ids.setdefault(p, list()).append(i)
+        values = list()
+        for p, cs, idea_values in objects:
+            for (idea, vs), i in zip(idea_values, ids.get(p.id, list())):
+                idea.id = i
+                for ic in vs:
+                    ic.idea_id, ic.criteria_id = i, ic.criteria.id
+                    values.append(ic)
+        IdeaCriteria.objects.bulk_create(values)
+
+        # Authoring, counters and search
+        Problem.collaborator.through.objects.bulk_create([
+            Problem.collaborator.through(problem_id=p.id, user_id=user.id) for p in problems])
+        content_type = ContentType.objects.get_for_model(Problem)
+        Follow.objects.bulk_create([Follow(user=user, content_type=content_type,
+            object_id=str(p.id), actor_only=False) for p in problems])
+        counters.reconcile(Problem, [p.id for p in problems])
+        counters.reconcile(UserStats, [user.id])
+        search.add(problems + criteria + ideas)
+
+        # Activity
+        a = action.send(user, verb='imported')[0][1]
+        a.data = {'diff': '<ul>%s</ul>' % ''.join('<li>%s</li>' % escape(p.title) for p in problems),
+            'problems': [p.id for p in problems], 'criteria': len(criteria), 'ideas': len(ideas)}
+        a.save()
+    return len(problems), len(criteria), len(ideas)
@@ -0,0 +1,119 @@
+import json
+import traceback
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from dnstorm import settings
+from dnstorm.app.models import Job
+
+HANDLERS = dict()
+
+def handler(name):
+    """
+    Decorator to register a function as the handler for the jobs of the given
+    name. Handlers receive the data dict given to ``enqueue``.
+    """
+    def register(function):
+        HANDLERS[name] = function
+        return function
+    return register
+
+def enqueue(name, key='', **data):
+    """
+    Puts a job in the queue to be processed by the ``run_jobs`` command. When
+    the ``jobs_inline`` setting is enabled the job is run right away instead.
+    """
+    if settings.DNSTORM.get('jobs_inline', False):
+        HANDLERS[name](data)
+        return None
+    return Job.objects.create(name=name, key=key, data=json.dumps(data))
+
+def release():
+    """
+    Returns to pending the jobs claimed longer than the ``jobs_claim_timeout``
+    setting ago, left running by a worker that crashed or was killed. The
+    release counts as an attempt, so a job that keeps killing its worker is
+    marked as failed once it reaches the ``jobs_max_attempts`` setting.
+    """
+    timeout = settings.DNSTORM.get('jobs_claim_timeout', 600)
+    now = timezone.now()
+    jobs = Job.objects.filter(status='running', updated__lt=now - timedelta(seconds=timeout))
+    jobs.filter(attempts__gte=settings.DNSTORM.get('jobs_max_attempts', 5) - 1).update(status='failed',
+        attempts=F('attempts') + 1, error='Still running after %d seconds.' % timeout, updated=now)
+    return jobs.update(status='pending', attempts=F('attempts') + 1, updated=now)
+
+def prune(days):
+    """
+    Deletes the jobs done more than the given number of days ago.
+    """
+    jobs = Job.objects.filter(status='done', updated__lt=timezone.now() - timedelta(days=days))
+    count = jobs.count()
+    jobs.delete()
+    return count
+
+def claim(batch_size):
+    """
+    Marks a batch of the pending jobs as running and returns them. Jobs
+    already claimed by another worker are left out.
+    """
+    jobs = list()
+    for job in Job.objects.filter(status='pending', run_after__lte=timezone.now()).order_by('id')[:batch_size]:
+        if Job.objects.filter(id=job.id, status='pending').update(status='running', updated=timezone.now()):
+            jobs.append(job)
+    return jobs
+
+def run(job):
+    """
+    Runs a single job, scheduling a retry with an increasing delay if it
+    fails before reaching the ``jobs_max_attempts`` setting.
+    """
+    job.attempts += 1
+    try:
+        HANDLERS[job.name](json.loads(job.data) if job.data else dict())
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < settings.DNSTORM.get('jobs_max_attempts', 5):
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.DNSTORM.get('jobs_retry_delay', 30) * 2 ** (job.attempts - 1))
+        else:
+            job.status = 'failed'
+    else:
+        job.status = 'done'
+    job.save()
+    return job.status == 'done'
+
+def run_batch(batch_size=None):
+    """
+    Claims and runs a batch of jobs. When more than one job in the batch share
+    the same key only the last one is run and the others are marked as done.
+    Returns the number of claimed jobs.
+    """
+    jobs = claim(batch_size or settings.DNSTORM.get('jobs_batch_size', 50))
+    last = dict((job.key, job.id) for job in jobs if job.key)
+    skipped = [job.id for job in jobs if job.key and last[job.key] != job.id]
+    Job.objects.filter(id__in=skipped).update(status='done', updated=timezone.now())
+    for job in jobs:
+        if job.id not in skipped:
+            run(job)
+    return len(jobs)
+
+@handler('activity_register')
+def activity_register(data):
+    """
+    Registers the activity enqueued by ``dnstorm.app.utils.activity_register``.
+    Objects deleted in the meantime are ignored.
+    """
+    from django.contrib.auth.models import User
+    from django.db.models.loading import get_model
+    from dnstorm.app.utils import activity_process, get_object_or_none
+
+    user = get_object_or_none(User, id=data['user'])
+    obj = get_object_or_none(get_model('app', data['klass']), id=data['pk'])
+    if not user or not obj:
+        return None
+    if 'edit_message' in data:
+        obj.edit_message = data['edit_message']
+    activity_process(user, obj)
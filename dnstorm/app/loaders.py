@@ -0,0 +1,193 @@
+import copy
+
+from django.db.models import Q
+from django.db.models.query import prefetch_related_objects
+
+from dnstorm.app import fragments, perms
+from dnstorm.app.models import Alternative, Comment, Criteria, Idea, IdeaCriteria, Vote
+from dnstorm.app.results import StrategyTable
+from dnstorm.app.utils import load_tooltips, load_user_stats, user_stats
+
+class ProblemLoader(object):
+    """
+    Loads all the objects displayed in the problem page in a fixed number of
+    queries, whatever the size of the problem. The loaded objects get the
+    same attributes their ``get_data`` methods would fill, so the templates
+    can use them the same way.
+
+    Attributes:
+        * ``comments`` list of comments made directly for the problem
+        * ``criteria`` list of criteria ordered by name
+        * ``ideas`` published ideas ordered by votes
+        * ``ideas_drafts`` ideas drafts of the user ordered by votes
+        * ``alternatives`` alternatives ordered by the user's vote
+    """
+
+    def __init__(self, problem, user=False):
+        self.problem = problem
+        self.viewer = user
+        self.user = user if user and user.is_authenticated() else False
+        self.load()
+
+    def load(self):
+        self.load_comments()
+        self.load_votes()
+        self.load_criteria()
+        self.load_ideas()
+        self.load_alternatives()
+        self.load_users()
+        self.load_fragments()
+
+    def get_comments(self, target, obj):
+        return self.comments_by_target.get((target, obj.id), list())
+
+    def load_comments(self):
+        """
+        Comments for the problem and all of its objects grouped by target.
+        """
+        self.comments_by_target = dict()
+        for c in Comment.objects.filter(
+            Q(problem=self.problem) | Q(criteria__problem=self.problem) |
+            Q(idea__problem=self.problem) | Q(alternative__problem=self.problem)) \
+            .select_related('author').order_by('created'):
+            for target in ['problem', 'criteria', 'idea', 'alternative']:
+                if getattr(c, '%s_id' % target):
+                    self.comments_by_target.setdefault((target, getattr(c, '%s_id' % target)), list()).append(c)
+        self.comments = self.comments_by_target.get(('problem', self.problem.id), list())
+
+    def load_votes(self):
+        """
+        Votes for the ideas and alternatives of the problem grouped by object,
+        and the ones given by the user.
+        """
+        self.idea_votes = dict()
+        self.alternative_votes = dict()
+        self.user_idea_votes = set()
+        self.user_alternative_votes = dict()
+        for v in Vote.objects.filter(
+            Q(idea__problem=self.problem) | Q(alternative__problem=self.problem)) \
+            .order_by('-value'):
+            if v.idea_id:
+                self.idea_votes[v.idea_id] = self.idea_votes.get(v.idea_id, 0) + 1
+                if self.user and v.author_id == self.user.id:
+                    self.user_idea_votes.add(v.idea_id)
+            if v.alternative_id:
+                self.alternative_votes.setdefault(v.alternative_id, list()).append(v)
+                if self.user and v.author_id == self.user.id:
+                    self.user_alternative_votes.setdefault(v.alternative_id, v)
+
+    def load_criteria(self):
+        self.criteria = list(Criteria.objects.filter(problem=self.problem)
+            .select_related('author').prefetch_related('coauthor').order_by('name'))
+        load_tooltips(self.criteria)
+        for c in self.criteria:
+            c.problem = self.problem
+            c.comments = self.get_comments('criteria', c)
+            c._data = True
+
+    def load_ideas(self):
+        """
+        Published ideas and the user's drafts with the values given for each
+        criteria.
+        """
+        values = dict()
+        for ic in IdeaCriteria.objects.filter(idea__problem=self.problem):
+            values[(ic.idea_id, ic.criteria_id)] = ic
+
+        ideas = Idea.objects.filter(problem=self.problem)
+        if self.user:
+            ideas = ideas.filter(Q(published=True) | Q(author=self.user))
+        else:
+            ideas = ideas.filter(published=True)
+
+        self.ideas = list()
+        self.ideas_drafts = list()
+        for idea in ideas.select_related('author').prefetch_related('coauthor'):
+            idea.problem = self.problem
+            idea.comments = self.get_comments('idea', idea)
+            idea.criteria = list()
+            for c in self.criteria:
+                ic = values.get((idea.id, c.id), None)
+                c = copy.copy(c)
+                if ic:
+                    ic.criteria = c
+                c.value = ic.get_value() if ic else ''
+                c.user_description = getattr(ic, 'description', '')
+                idea.criteria.append(c)
+            idea.votes = idea.vote_count = self.idea_votes.get(idea.id, 0)
+            idea.voted = idea.id in self.user_idea_votes
+            idea._data = True
+            if idea.published:
+                self.ideas.append(idea)
+            else:
+                self.ideas_drafts.append(idea)
+        self.ideas.sort(key=lambda x: (x.votes, x.updated, x.created), reverse=True)
+        self.ideas_drafts.sort(key=lambda x: (x.votes, x.updated, x.created), reverse=True)
+
+    def load_alternatives(self):
+        """
+        Alternatives with their ideas, votes and results in the strategy
+        table.
+        """
+        table = StrategyTable.for_problem(self.problem)
+        self.alternatives = list(Alternative.objects.filter(problem=self.problem)
+            .select_related('author').prefetch_related('idea', 'coauthor'))
+        for a in self.alternatives:
+            a.problem = self.problem
+            a.comments = self.get_comments('alternative', a)
+            a.total_ideas = len(a.idea.all())
+            a.vote_objects = self.alternative_votes.get(a.id, list())
+            a.votes = a.vote_count = len(a.vote_objects)
+            vote = self.user_alternative_votes.get(a.id, None)
+            a.voted = True if vote else False
+            a.vote_value = vote.value if vote else 0
+            values = [v.value for v in a.vote_objects if v.value is not None]
+            a.vote_average = '%2.d%%' % (float(sum(values)) / len(values)) if values and sum(values) else '0%'
+            a.results = table.alternative_results(a)
+            a.fmt = table.criteria[-1].fmt if table.criteria else None
+            a._data = True
+        self.alternatives.sort(key=lambda x: (x.vote_value, x.updated, x.created), reverse=True)
+
+    def load_users(self):
+        """
+        Contribution stats of the authors and coauthors of the problem and its
+        objects, for the badges of their user boxes.
+        """
+        prefetch_related_objects([self.problem], ['coauthor'])
+        users = list()
+        for obj in [self.problem] + self.criteria + self.ideas + self.ideas_drafts + self.alternatives:
+            users.append(obj.author)
+            users.extend(obj.coauthor.all())
+        load_user_stats(users)
+
+    def badges(self, obj):
+        """
+        Contribution stats of the authors of an object shown in its fragment,
+        which change without a new version.
+        """
+        return ':'.join('%d.%d.%d' % (s.problem_count, s.idea_count, s.comment_count)
+            for s in [user_stats(u) for u in [obj.author] + list(obj.coauthor.all())])
+
+    def load_fragments(self):
+        """
+        Keys for the cached fragments of the criteria, ideas and alternatives,
+        varying on the permissions and votes of the user and on the
+        ``badges`` of their authors.
+        """
+        if not self.viewer:
+            return
+        user = self.viewer
+        flags = lambda *f: ''.join('1' if x else '0' for x in f)
+        comment = perms.problem(user, 'comment', self.problem)
+        roles = dict()
+        for c in self.criteria:
+            roles[c] = flags(perms.criteria(user, 'update', c), perms.criteria(user, 'delete', c), comment)
+        for i in self.ideas + self.ideas_drafts:
+            roles[i] = flags(perms.idea(user, 'update', i), perms.idea(user, 'delete', i), comment,
+                i.voted, self.user)
+        for a in self.alternatives:
+            roles[a] = flags(perms.alternative(user, 'update', a), perms.alternative(user, 'delete', a), comment,
+                a.voted, self.user) + '-%s' % a.vote_value
+        for obj in roles:
+            roles[obj] += '-%s' % self.badges(obj)
+        fragments.prepare(self.problem, roles.keys(), roles)
@@ -0,0 +1,68 @@
+import json
+import platform
+import sys
+from optparse import make_option
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from dnstorm.app import DNSTORM_VERSION, benchmark
+from dnstorm.app.benchmark import data
+
+class Command(BaseCommand):
+    help = 'Times the hot code paths against a synthetic dataset in a test database and outputs JSON.'
+    option_list = BaseCommand.option_list + tuple(
+        make_option('--%s' % size, type='int', dest=size, default=default,
+            help='Number of %s%s (default %d).' % (size, '' if size in ['users', 'problems'] else ' per problem', default))
+        for size, default in sorted(data.SIZES.items())) + (
+        make_option('--seed', type='int', dest='seed', default=0,
+            help='Seed of the dataset.'),
+        make_option('--repeat', type='int', dest='repeat', default=10,
+            help='Measured runs of each case.'),
+        make_option('--warmup', type='int', dest='warmup', default=2,
+            help='Runs of each case before measuring.'),
+        make_option('--case', action='append', dest='cases', default=[],
+            help='Run only this case. Can be given more than once.'),
+        make_option('--list', action='store_true', dest='list', default=False,
+            help='List the cases.'),
+        make_option('--output', dest='output', default=None,
+            help='Write the JSON to this file instead of the standard output.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            self.stdout.write('\n'.join(benchmark.CASES))
+            return
+        unknown = [c for c in options['cases'] if c not in benchmark.CASES]
+        if unknown:
+            raise CommandError('Unknown cases: %s. Use --list to see them.' % ', '.join(unknown))
+        small = ['--%s %d' % (s, n) for s, n in sorted(data.MINIMUM.items()) if options[s] < n]
+        if small:
+            raise CommandError('The dataset needs at least %s.' % ', '.join(small))
+
+        verbosity = int(options['verbosity'])
+        with benchmark.test_database(max(0, verbosity - 1)):
+            if verbosity > 1:
+                sys.stderr.write('Generating the dataset...\n')
+            context = data.generate(options['seed'], **dict((s, options[s]) for s in data.SIZES))
+            context['clients'] = benchmark.clients(context)
+            if verbosity > 1:
+                sys.stderr.write('Running %d cases...\n' % len(options['cases'] or benchmark.CASES))
+            results = benchmark.run(context, options['cases'], options['repeat'], options['warmup'])
+
+        output = json.dumps({
+            'version': DNSTORM_VERSION,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'platform': platform.platform(),
+            'seed': options['seed'],
+            'sizes': context['sizes'],
+            'cases': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,34 @@
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dnstorm.app import export
+from dnstorm.app.models import Problem
+
+class Command(BaseCommand):
+    help = 'Exports the strategy tables of all the problems, or of the given ones, as CSV, NDJSON or XLSX.'
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='csv',
+            help='One of %s.' % ', '.join(sorted(export.FORMATS))),
+        make_option('--problem', action='append', type='int', dest='problems', default=[],
+            help='Export only this problem. Can be given more than once.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=None,
+            help='Problems loaded at once, the export_batch_size setting by default.'),
+        make_option('--output', dest='output', default=None,
+            help='Write to this file instead of the standard output.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['format'] not in export.FORMATS:
+            raise CommandError('Unknown format %s.' % options['format'])
+        problems = Problem.objects.all()
+        if options['problems']:
+            problems = problems.filter(id__in=options['problems'])
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout
+        try:
+            for chunk in export.FORMATS[options['format']][0](export.rows(problems, options['batch_size'])):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,43 @@
+import time
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from dnstorm.app import importer
+from dnstorm.app.utils import get_object_or_none
+
+class Command(BaseCommand):
+    args = '<file>'
+    help = 'Imports problems, criteria and ideas from a CSV or JSON file.'
+    option_list = BaseCommand.option_list + (
+        make_option('--user', dest='user', default=None,
+            help='Username of the author of the imported objects.'),
+        make_option('--format', dest='format', default=None,
+            help='csv or json, by the file extension by default.'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Only validate the file.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Give the file to import.')
+        user = get_object_or_none(User, username=options['user'])
+        if not user:
+            raise CommandError('User %s not found.' % options['user'])
+        fmt = options['format'] or args[0].rsplit('.', 1)[-1].lower()
+        if fmt not in ['csv', 'json']:
+            raise CommandError('Unknown format %s.' % fmt)
+
+        start = time.time()
+        try:
+            with open(args[0], 'rb') as f:
+                objects = importer.validate(importer.parse(f, fmt), user)
+        except importer.InvalidImport as e:
+            raise CommandError('Invalid file:\n%s' % '\n'.join(e.errors))
+        if options['dry_run']:
+            counts = (len(objects), sum(len(c) for p, c, i in objects), sum(len(i) for p, c, i in objects))
+        else:
+            counts = importer.save(objects, user)
+        self.stdout.write('%s %d problems, %d criteria and %d ideas in %.2fs.' % (
+            ('Validated' if options['dry_run'] else 'Imported',) + counts + (time.time() - start,)))
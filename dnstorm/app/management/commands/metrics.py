@@ -0,0 +1,65 @@
+import json
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest
+from django.test.client import Client
+from django.utils.importlib import import_module
+
+from dnstorm.app import metrics
+from dnstorm.app.utils import get_object_or_none
+
+class Command(BaseCommand):
+    help = 'Shows the queries, database time, render time and latency recorded by URL name.'
+    option_list = BaseCommand.option_list + (
+        make_option('--url', action='append', dest='urls', default=[],
+            help='Request an URL in this process before the report. Can be given more than once.'),
+        make_option('--user', dest='user', default=None,
+            help='Username to request the URLs with.'),
+        make_option('--json', action='store_true', dest='json', default=False,
+            help='Output the report as JSON.'),
+        make_option('--reset', action='store_true', dest='reset', default=False,
+            help='Clear the recorded metrics.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            metrics.reset()
+            return
+
+        client = Client()
+        if options['user']:
+            user = get_object_or_none(User, username=options['user'])
+            if not user:
+                raise CommandError('User %s not found.' % options['user'])
+            self.login(client, user)
+        for url in options['urls']:
+            response = client.get(url)
+            if int(options['verbosity']) > 1:
+                self.stdout.write('%s %d' % (url, response.status_code))
+
+        rows = metrics.report(metrics.collect())
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self.stdout.write('%-32s %6s %23s %9s %9s %17s' % ('name', 'count', 'queries avg/p95/max', 'db avg', 'render', 'total avg/p95'))
+        for r in rows:
+            self.stdout.write('%-32s %6d %9.1f/%5s/%5d%s %7.1fms %7.1fms %7.1f/%7sms' % (r['name'], r['count'],
+                r['queries']['avg'], r['queries']['p95'], r['queries']['max'],
+                '!' if r['budget'] is not None and r['queries']['max'] > r['budget'] else ' ',
+                r['db_time']['avg'], r['render_time']['avg'], r['total_time']['avg'], r['total_time']['p95']))
+
+    def login(self, client, user):
+        """
+        Logs the client in as the user without a password, the same way
+        ``Client.login`` does.
+        """
+        user.backend = 'django.contrib.auth.backends.ModelBackend'
+        request = HttpRequest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        login(request, user)
+        request.session.save()
+        client.cookies[settings.SESSION_COOKIE_NAME] = request.session.session_key
@@ -0,0 +1,109 @@
+import json
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dnstorm import settings
+from dnstorm.app import benchmark
+from dnstorm.app.benchmark import data, routes
+
+class Command(BaseCommand):
+    help = ('Counts the queries of every route for each role on a small and a large dataset, '
+        'failing when a count grows with the dataset or goes over its query budget.')
+    option_list = BaseCommand.option_list + (
+        make_option('--route', action='append', dest='routes', default=[],
+            help='Check only this route. Can be given more than once.'),
+        make_option('--tolerance', type='int', dest='tolerance', default=0,
+            help='Queries a route can grow on the large dataset.'),
+        make_option('--baseline', dest='baseline', default=None,
+            help='JSON output of a previous run. Only the counts higher than there are checked.'),
+        make_option('--json', action='store_true', dest='json', default=False,
+            help='Output the counts as JSON.'),
+        make_option('--budgets', action='store_true', dest='budgets', default=False,
+            help='Output the counts as the query_budgets setting. Refused while any count grows '
+                'with the dataset or fails.'),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options['verbosity'])
+        baseline = dict()
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                for row in json.load(f)['rows']:
+                    for role, c in row['roles'].items():
+                        baseline[(row['name'], role)] = c
+        counts = dict()
+        # Keep the messages printed by autoslug for the drafts made by the
+        # create pages out of the report
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            for size, sizes in [('small', routes.SMALL), ('large', routes.LARGE)]:
+                with benchmark.test_database(max(0, verbosity - 2)):
+                    if verbosity > 1:
+                        sys.stderr.write('Walking the routes on the %s dataset...\n' % size)
+                    context = data.generate(**sizes)
+                    context['clients'] = benchmark.clients(context)
+                    counts[size] = routes.walk(context, options['routes'])
+        finally:
+            sys.stdout = stdout
+
+        names = sorted(set(name for name, role in counts['large']))
+        budgets = settings.DNSTORM.get('query_budgets', dict())
+        rows, failures, growths = list(), list(), list()
+        for name in names:
+            row = {'name': name, 'budget': budgets.get(name), 'roles': dict()}
+            for role in routes.ROLES:
+                small, large = counts['small'][(name, role)], counts['large'][(name, role)]
+                row['roles'][role] = {'small': small, 'large': large}
+                if not options['budgets'] and self.lower(row['roles'][role], baseline.get((name, role))):
+                    continue
+                if self.error(small) or self.error(large):
+                    growths.append('%s (%s) failed with %s' % (name, role, self.error(large) or self.error(small)))
+                elif large - small > options['tolerance']:
+                    growths.append('%s (%s) grew from %d to %d queries' % (name, role, small, large))
+                elif row['budget'] is not None and large > row['budget']:
+                    failures.append('%s (%s) ran %d queries, over its budget of %d' % (name, role, large, row['budget']))
+            rows.append(row)
+
+        failures = growths + failures
+
+        if options['budgets']:
+            # Budgets are only taken from a run where no count grows, whatever
+            # the baseline, so they never accept a leak
+            if growths:
+                raise CommandError('No budgets while %d query counts grow or fail:\n%s' % (
+                    len(growths), '\n'.join(growths)))
+            self.stdout.write('\'query_budgets\': {')
+            for row in rows:
+                self.stdout.write('    \'%s\': %d,' % (row['name'],
+                    max(max(c['small'], c['large']) for c in row['roles'].values())))
+            self.stdout.write('},')
+            return
+        elif options['json']:
+            self.stdout.write(json.dumps({'rows': rows, 'failures': failures}, indent=2))
+        else:
+            self.stdout.write('%-28s %8s %s' % ('route', 'budget', ' '.join('%15s' % r for r in routes.ROLES)))
+            for row in rows:
+                self.stdout.write('%-28s %8s %s' % (row['name'], row['budget'] if row['budget'] is not None else '-',
+                    ' '.join('%15s' % self.cell(row['roles'][r]) for r in routes.ROLES)))
+
+        if failures:
+            raise CommandError('%d query count checks failed:\n%s' % (len(failures), '\n'.join(failures)))
+
+    def lower(self, counts, baseline):
+        """
+        If the counts are not higher than the ones of the baseline.
+        """
+        return baseline is not None and all(not self.error(c) and not self.error(b) and c <= b
+            for c, b in [(counts['small'], baseline['small']), (counts['large'], baseline['large'])])
+
+    def error(self, count):
+        """
+        The error of a request that failed instead of giving a count.
+        """
+        return count if isinstance(count, basestring) else None
+
+    def cell(self, counts):
+        small, large = ['error' if self.error(c) else str(c) for c in [counts['small'], counts['large']]]
+        return '%s -> %s' % (small, large) if small != large else small
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dnstorm.app import search
+from dnstorm.app.models import SearchTerm
+
+class Command(BaseCommand):
+    help = 'Indexes all the problems, criteria, ideas and comments again for the search.'
+
+    def handle(self, *args, **options):
+        with transaction.commit_on_success():
+            search.rebuild()
+        if int(options['verbosity']) > 1:
+            self.stdout.write('%d terms indexed' % SearchTerm.objects.count())
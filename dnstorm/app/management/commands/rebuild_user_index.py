@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dnstorm.app import user_index
+from dnstorm.app.models import UserSearchKey
+
+class Command(BaseCommand):
+    help = 'Indexes all the users again for the collaborators search.'
+
+    def handle(self, *args, **options):
+        with transaction.commit_on_success():
+            user_index.rebuild()
+        if int(options['verbosity']) > 1:
+            self.stdout.write('%d keys indexed' % UserSearchKey.objects.count())
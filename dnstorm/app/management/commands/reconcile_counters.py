@@ -0,0 +1,21 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dnstorm.app import counters
+
+class Command(BaseCommand):
+    help = 'Fixes the counters of problems, ideas and alternatives that drifted from their actual values.'
+    option_list = BaseCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Only report the drifted objects.'),
+    )
+
+    def handle(self, *args, **options):
+        for model in counters.COUNTERS:
+            with transaction.commit_on_success():
+                drifted = counters.reconcile(model, commit=not options['dry_run'])
+            if drifted or int(options['verbosity']) > 1:
+                self.stdout.write('%s: %d drifted%s' % (model.__name__, len(drifted),
+                    ' (%s)' % ', '.join(str(i) for i in drifted[:20]) if drifted else ''))
@@ -0,0 +1,34 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from dnstorm.app import jobs
+
+class Command(BaseCommand):
+    help = 'Processes the background jobs queue.'
+    option_list = BaseCommand.option_list + (
+        make_option('--once', action='store_true', dest='once', default=False,
+            help='Process the pending jobs and exit.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=None,
+            help='Number of jobs claimed at once.'),
+        make_option('--sleep', type='float', dest='sleep', default=2,
+            help='Seconds to wait when the queue is empty.'),
+        make_option('--prune-days', type='int', dest='prune_days', default=None,
+            help='Delete the jobs done more than this number of days ago.'),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            jobs.release()
+            count = jobs.run_batch(options['batch_size'])
+            if count and int(options['verbosity']) > 1:
+                self.stdout.write('Processed %d jobs.' % count)
+            if not count:
+                if options['prune_days'] is not None:
+                    pruned = jobs.prune(options['prune_days'])
+                    if pruned and int(options['verbosity']) > 1:
+                        self.stdout.write('Deleted %d done jobs.' % pruned)
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
@@ -0,0 +1,259 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from dnstorm import settings
+
+logger = logging.getLogger('dnstorm.metrics')
+
+# Upper bounds of the histogram buckets of each metric, in milliseconds for
+# the times. Values above the last bound go to an overflow bucket.
+BUCKETS = {
+    'queries': [1, 2, 5, 10, 20, 50, 100, 200, 500],
+    'db_time': [1, 5, 10, 25, 50, 100, 250, 500, 1000],
+    'render_time': [1, 5, 10, 25, 50, 100, 250, 500, 1000],
+    'total_time': [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+}
+
+# Actions routed by ``AjaxView``, in the order they are checked
+AJAX_ACTIONS = ['collaborator_delete', 'collaborator_add', 'idea_like', 'alternative_like',
+    'activity_reset_counter', 'user_search', 'help', 'comment_new']
+
+STATS = dict()
+LOCK = threading.Lock()
+LAST_FLUSH = 0
+local = threading.local()
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class Request(object):
+    """
+    Measures of the request being processed by the current thread.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.depth = 0
+
+# Table of the database cache, if in use. Its queries are cache round trips
+# that other cache backends make without the database, so they are left out
+# of the query counts.
+CACHE_TABLE = settings.CACHES['default']['LOCATION'] \
+    if settings.CACHES['default']['BACKEND'].endswith('.DatabaseCache') else None
+
+class CursorWrapper(object):
+    """
+    Database cursor adding the queries it runs and their time to the measures
+    of the current request. Queries of the database cache only add their time.
+    """
+
+    def __init__(self, cursor, request):
+        self.cursor = cursor
+        self.request = request
+
+    def execute(self, sql, *args, **kwargs):
+        return self.measure(self.cursor.execute, sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self.measure(self.cursor.executemany, sql, *args, **kwargs)
+
+    def measure(self, method, sql, *args, **kwargs):
+        start = time.time()
+        try:
+            return method(sql, *args, **kwargs)
+        finally:
+            if not CACHE_TABLE or CACHE_TABLE not in sql:
+                self.request.queries += 1
+            self.request.db_time += time.time() - start
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+def current():
+    return getattr(local, 'request', None)
+
+def install():
+    """
+    Instruments the database cursors and the template rendering once per
+    process. Nothing is measured outside of ``start`` and ``stop``.
+    """
+    from django.db.backends import BaseDatabaseWrapper
+    from django.template.base import Template
+
+    if getattr(BaseDatabaseWrapper.cursor, 'instrumented', False):
+        return
+    cursor, render = BaseDatabaseWrapper.cursor, Template.render
+
+    def instrumented_cursor(self):
+        request = current()
+        return CursorWrapper(cursor(self), request) if request else cursor(self)
+
+    def instrumented_render(self, context):
+        request = current()
+        if not request:
+            return render(self, context)
+        start = time.time()
+        request.depth += 1
+        try:
+            return render(self, context)
+        finally:
+            request.depth -= 1
+            if not request.depth:
+                request.render_time += time.time() - start
+
+    instrumented_cursor.instrumented = True
+    BaseDatabaseWrapper.cursor = instrumented_cursor
+    Template.render = instrumented_render
+
+def name(request):
+    """
+    Name the request is recorded by: the resolved URL name, with the action
+    for ``AjaxView`` requests, like ``ajax:comment_new``.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if not match or not match.url_name:
+        return None
+    if match.url_name == 'ajax':
+        params = request.POST if request.method == 'POST' else request.GET
+        return 'ajax:%s' % next((a for a in AJAX_ACTIONS if params.get(a)), 'unknown')
+    return match.url_name
+
+def start():
+    local.request = Request()
+
+def stop(name):
+    """
+    Ends the measures of the current request and records them by name, if
+    given. Returns the measures, with times in milliseconds.
+    """
+    request, local.request = current(), None
+    if not request:
+        return None
+    values = {
+        'queries': request.queries,
+        'db_time': request.db_time * 1000,
+        'render_time': request.render_time * 1000,
+        'total_time': (time.time() - request.start) * 1000,
+    }
+    if name:
+        record(name, values)
+        budget(name, values['queries'])
+    return values
+
+def record(name, values):
+    """
+    Adds the measures of a request to the histograms of its name, flushing
+    them to the cache every ``metrics_flush_interval`` seconds.
+    """
+    global LAST_FLUSH
+    with LOCK:
+        stats = STATS.setdefault(name, dict((m, histogram(m)) for m in BUCKETS))
+        for metric, value in values.items():
+            add(stats[metric], metric, value)
+        if time.time() - LAST_FLUSH > settings.DNSTORM.get('metrics_flush_interval', 60):
+            LAST_FLUSH = time.time()
+            flush()
+
+def budget(name, queries):
+    """
+    Checks the queries of a request against the ``query_budgets`` setting,
+    logging a warning when exceeded or raising ``QueryBudgetExceeded`` with
+    the ``query_budget_strict`` setting, meant for tests.
+    """
+    limit = settings.DNSTORM.get('query_budgets', dict()).get(name)
+    if limit is None or queries <= limit:
+        return
+    message = '%s ran %d queries, over its budget of %d' % (name, queries, limit)
+    if settings.DNSTORM.get('query_budget_strict', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+def histogram(metric):
+    return {'counts': [0] * (len(BUCKETS[metric]) + 1), 'sum': 0, 'max': 0}
+
+def add(h, metric, value):
+    h['counts'][bisect_left(BUCKETS[metric], value)] += 1
+    h['sum'] += value
+    h['max'] = max(h['max'], value)
+
+def merge(h, other):
+    h['counts'] = [a + b for a, b in zip(h['counts'], other['counts'])]
+    h['sum'] += other['sum']
+    h['max'] = max(h['max'], other['max'])
+
+def percentile(h, metric, p):
+    """
+    Upper bound of the bucket of the given percentile, or the maximum for
+    the overflow bucket.
+    """
+    total, seen = sum(h['counts']), 0
+    for i, count in enumerate(h['counts']):
+        seen += count
+        if total and seen >= total * p / 100.0:
+            return BUCKETS[metric][i] if i < len(BUCKETS[metric]) else h['max']
+    return 0
+
+def cache_key(pid=None):
+    return '%s_metrics_%s' % (settings.DNSTORM['table_prefix'], pid if pid is not None else 'processes')
+
+def flush():
+    """
+    Stores the histograms of this process in the cache, where the ones of
+    all the processes are read by ``collect``.
+    """
+    timeout = settings.DNSTORM.get('metrics_flush_interval', 60) * 10
+    pid = os.getpid()
+    processes = cache.get(cache_key()) or list()
+    if pid not in processes:
+        cache.set(cache_key(), processes[-49:] + [pid], timeout)
+    cache.set(cache_key(pid), STATS, timeout)
+
+def collect():
+    """
+    Histograms of all the processes merged by name.
+    """
+    with LOCK:
+        flush()
+    stats = dict()
+    for snapshot in cache.get_many([cache_key(pid) for pid in cache.get(cache_key()) or list()]).values():
+        for name, metrics in snapshot.items():
+            merged = stats.setdefault(name, dict((m, histogram(m)) for m in BUCKETS))
+            for metric, h in metrics.items():
+                merge(merged[metric], h)
+    return stats
+
+def reset():
+    with LOCK:
+        STATS.clear()
+        cache.delete_many([cache_key(pid) for pid in cache.get(cache_key()) or list()] + [cache_key()])
+
+def report(stats):
+    """
+    Rows with the number of requests of each name and the average, 50th and
+    95th percentiles and maximum of each metric, slowest names first.
+    """
+    rows = list()
+    for name, metrics in stats.items():
+        count = sum(metrics['total_time']['counts'])
+        if not count:
+            continue
+        row = {'name': name, 'count': count, 'budget': settings.DNSTORM.get('query_budgets', dict()).get(name)}
+        for metric, h in metrics.items():
+            row[metric] = {
+                'avg': round(float(h['sum']) / count, 2),
+                'p50': percentile(h, metric, 50),
+                'p95': percentile(h, metric, 95),
+                'max': round(h['max'], 2)}
+        rows.append(row)
+    return sorted(rows, key=lambda r: -r['total_time']['avg'] * r['count'])
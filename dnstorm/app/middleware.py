@@ -0,0 +1,23 @@
+from django.core.exceptions import MiddlewareNotUsed
+
+from dnstorm import settings
+from dnstorm.app import metrics
+
+class MetricsMiddleware(object):
+    """
+    Records the queries, database time, template render time and latency of
+    the requests by URL name and AJAX action in ``dnstorm.app.metrics``.
+    Should be the first middleware to measure the whole request.
+    """
+
+    def __init__(self):
+        if not settings.DNSTORM.get('metrics', True):
+            raise MiddlewareNotUsed
+        metrics.install()
+
+    def process_request(self, request):
+        metrics.start()
+
+    def process_response(self, request, response):
+        metrics.stop(metrics.name(request))
+        return response
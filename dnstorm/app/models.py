@@ -1,32 +1,40 @@
+import hashlib
 import operator
 import random
 import re
+import uuid
 from datetime import datetime
 from collections import OrderedDict
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import models
 from django.db.models import Avg
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.safestring import mark_safe
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import get_language, ugettext_lazy as _
 
 from autoslug import AutoSlugField
 from ckeditor.fields import RichTextField
 from registration.signals import user_activated
 
 from dnstorm import settings
-from dnstorm.app.utils import get_object_or_none
+from dnstorm.app.utils import get_object_or_none, load_tooltips
 
 class Option(models.Model):
     """
     Meta-based table to store general site options retrieved via the ``get``
     method.
 
+    All the options are loaded at once into a process-local cache. A version
+    stamp kept in the cache is changed on every ``update``, so other
+    processes will know they need to load the options again. This requires
+    a cache backend shared by all the processes, as set in ``CACHES``.
+
     Attributes:
         * ``name`` unique entry key
         * ``value`` value for the key
@@ -34,12 +42,32 @@ class Option(models.Model):
     name = models.TextField(verbose_name=_('Name'), blank=False, unique=True)
     value = models.TextField(verbose_name=_('Value'), blank=False)
 
+    cache_key = settings.DNSTORM['table_prefix'] + '_option_version'
+    cache_timeout = 60 * 60 * 24 * 30
+    _cache = dict()
+
     class Meta:
         db_table = settings.DNSTORM['table_prefix'] + '_option'
 
     def type(self):
         return _('option')
 
+    def get_cached(self):
+        """
+        Returns a dict with all the stored options, querying the database only
+        when the shared version stamp differs from the loaded one.
+        """
+        version = cache.get(Option.cache_key)
+        if version is None:
+            cache.add(Option.cache_key, uuid.uuid4().hex, Option.cache_timeout)
+            version = cache.get(Option.cache_key)
+        if version is None or Option._cache.get('version') != version:
+            Option._cache = {
+                'version': version,
+                'options': dict(Option.objects.values_list('name', 'value'))
+            }
+        return Option._cache['options']
+
     def get(self, *args):
         """
         The site options are defined and saved by the OptionsForm fields,
@@ -49,15 +77,19 @@ class Option(models.Model):
         """
         if len(args) <= 0 or len(args) > 1:
             return None
-        try:
-            option = Option.objects.get(name=args[0])
-            value = option.value
-        except Option.DoesNotExist:
-            defaults = self.get_defaults()
-            if args[0] not in defaults:
-                return None
-            value = defaults[args[0]]
-        return value
+        options = self.get_cached()
+        if args[0] in options:
+            return options[args[0]]
+        return self.get_defaults().get(args[0], None)
+
+    def get_many(self, *args):
+        """
+        Same as ``get`` for many options at once. Returns a dict of values by
+        option name.
+        """
+        options = self.get_cached()
+        defaults = self.get_defaults()
+        return dict((name, options[name] if name in options else defaults.get(name, None)) for name in args)
 
     def update(self, *args):
         """
@@ -71,6 +103,8 @@ class Option(models.Model):
             option = Option(name=args[0], value=None)
         option.value = args[1]
         option.save()
+        cache.set(Option.cache_key, uuid.uuid4().hex, Option.cache_timeout)
+        Option._cache = dict()
         return True
 
     def get_defaults(self, *args, **kwargs):
@@ -88,11 +122,7 @@ class Option(models.Model):
         """
         Get all the default values.
         """
-        options = dict()
-        defaults = self.get_defaults()
-        for default in defaults:
-            options[default] = self.get(default)
-        return options
+        return self.get_many(*self.get_defaults().keys())
 
 class Problem(models.Model):
     """
@@ -108,6 +138,8 @@ class Problem(models.Model):
     Attributes:
      * ``last_activity`` Gets updated in favor of the ``ActivityManager``
        ordering every time an idea or a comment is made for this problem.
+     * ``idea_count``, ``criteria_count``, ``alternative_count`` and
+       ``comment_count`` are kept by ``dnstorm.app.counters``.
     """
     title = models.CharField(verbose_name=_('Title'), max_length=90, help_text=_('Give your problem a compreensive title, this will be the main call for users.'))
     slug = AutoSlugField(populate_from='title', max_length=60, editable=False, unique=True, always_update=True)
@@ -121,6 +153,10 @@ class Problem(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False, default='2000-01-01')
     updated = models.DateTimeField(auto_now=True, editable=False, default='2000-01-01')
     last_activity = models.DateTimeField(auto_now=True, editable=False, default='2000-01-01')
+    idea_count = models.PositiveIntegerField(editable=False, default=0)
+    criteria_count = models.PositiveIntegerField(editable=False, default=0)
+    alternative_count = models.PositiveIntegerField(editable=False, default=0)
+    comment_count = models.PositiveIntegerField(editable=False, default=0)
 
     class Meta:
         db_table = settings.DNSTORM['table_prefix'] + '_problem'
@@ -131,31 +167,15 @@ class Problem(models.Model):
     def get_absolute_url(self, *args, **kwargs):
         return reverse('problem', args=[self.id, self.slug])
 
-    def idea_count(self):
-        return self.idea_set.filter(published=True).count()
-
-    def alternative_count(self):
-        return self.alternative_set.count()
-
-    def criteria_count(self):
-        return self.criteria_set.count()
-
     def get_data(self, user=False):
         if not hasattr(self, '_data'):
             self.fill_data(user)
         self._data = True
 
     def fill_data(self, user=False):
-        self.criteria_results = list()
+        from dnstorm.app.results import stored_criteria_results
         self.comments = Comment.objects.filter(problem=self).order_by('created')
-        for c in self.criteria_set.order_by('name').all():
-            alternatives = list()
-            for a in self.alternative_set.all():
-                a.get_data(user)
-                a.value = a.results[c.id].result_value
-                alternatives.append(a)
-            alternatives.sort(key=lambda x:x.name, reverse=True)
-            self.criteria_results.append({'criteria': c, 'alternatives': alternatives})
+        self.criteria_results = stored_criteria_results(self)
 
     def send_invitation(self, request):
         invitation = get_object_or_none(models.Invitation, user=self)
@@ -226,11 +246,25 @@ class Criteria(models.Model):
         }
         return icons[self.fmt]
 
-    def tooltip(self):
+    def tooltip_key(self):
+        return '%s_tooltip_criteria_%d_%s_%s' % (settings.DNSTORM['table_prefix'], self.id,
+            self.updated.strftime('%Y%m%d%H%M%S%f') if self.updated else '', get_language())
+
+    def render_tooltip(self):
         return re.sub('\n', '', re.sub(' {2,}', '',
             render_to_string('item_criteria_parameters.html',
             {'criteria': self, 'show_paragraphs': True, 'show_icons': True})))
 
+    def tooltip(self):
+        """
+        Tooltip with the parameters of the criteria, cached until it gets
+        updated. Lists of criteria get them at once with
+        ``dnstorm.app.utils.load_tooltips``.
+        """
+        if '_tooltip' not in self.__dict__:
+            load_tooltips([self])
+        return self._tooltip
+
     def get_data(self, user=False):
         if not hasattr(self, '_data'):
             self.fill_data(user)
@@ -253,6 +287,8 @@ class Idea(models.Model):
     published = models.BooleanField(editable=False, blank=True, default=False)
     created = models.DateTimeField(auto_now_add=True, default='2000-01-01')
     updated = models.DateTimeField(auto_now=True, default='2000-01-01')
+    vote_count = models.PositiveIntegerField(editable=False, default=0)
+    comment_count = models.PositiveIntegerField(editable=False, default=0)
 
     class Meta:
         db_table = settings.DNSTORM['table_prefix'] + '_idea'
@@ -266,18 +302,21 @@ class Idea(models.Model):
             'slug': self.problem.slug,
             'idea': self.id })
 
-    def vote_count(self):
-        w = Vote.objects.filter(idea=self).count()
-        return w if w else 0
-
     def tooltip(self):
+        """
+        Tooltip with the values of the idea for each criteria, cached by the
+        values and the criteria shown.
+        """
         self.get_data()
-        html = []
-        for c in self.criteria:
-            html.append(render_to_string('item_idea_tooltip.html', {
-                'criteria': c, 'show_paragraphs': True,
-                'show_icons': True, 'mode': 'tooltip'}))
-        return re.sub('\n', '', re.sub(' {2,}', '', ''.join(html)))
+        key = '%s_tooltip_idea_%s' % (settings.DNSTORM['table_prefix'], hashlib.md5(repr(
+            [get_language()] + [(c.id, c.name, c.fmt, c.value) for c in self.criteria])).hexdigest())
+        html = cache.get(key)
+        if html is None:
+            html = re.sub('\n', '', re.sub(' {2,}', '', render_to_string('item_idea_tooltip_list.html', {
+                'criteria_list': self.criteria, 'show_paragraphs': True,
+                'show_icons': True, 'mode': 'tooltip'})))
+            cache.set(key, html, settings.DNSTORM.get('tooltip_cache_timeout', 60 * 60 * 24))
+        return html
 
     def get_data(self, user=False):
         if not hasattr(self, '_data'):
@@ -293,8 +332,11 @@ class Idea(models.Model):
         # Criterias
 
         self.criteria = list()
+        values = dict((ic.criteria_id, ic) for ic in IdeaCriteria.objects.filter(idea=self))
         for c in self.problem.criteria_set.order_by('name').all():
-            ic = get_object_or_none(IdeaCriteria, idea=self, criteria=c)
+            ic = values.get(c.id, None)
+            if ic:
+                ic.criteria = c
             c.value = ic.get_value() if ic else ''
             d = getattr(ic, 'description', '')
             c.user_description = d
@@ -303,7 +345,7 @@ class Idea(models.Model):
 
         # Votes
 
-        self.votes = self.vote_count()
+        self.votes = self.vote_count
         self.voted = Vote.objects.filter(idea=self, author=user).exists() if user and user.is_authenticated() else False
 
 class IdeaCriteria(models.Model):
@@ -348,6 +390,9 @@ class Alternative(models.Model):
     order = models.PositiveSmallIntegerField(editable=False, default=0)
     created = models.DateTimeField(auto_now_add=True, editable=False, default='2001-01-01')
     updated = models.DateTimeField(auto_now=True, editable=False, default='2000-01-01')
+    vote_count = models.PositiveIntegerField(editable=False, default=0)
+    vote_sum = models.IntegerField(editable=False, default=0)
+    comment_count = models.PositiveIntegerField(editable=False, default=0)
 
     class Meta:
         db_table = settings.DNSTORM['table_prefix'] + '_alternative'
@@ -361,10 +406,6 @@ class Alternative(models.Model):
             'slug': self.problem.slug,
             'alternative': self.id })
 
-    def vote_count(self):
-        w = Vote.objects.filter(alternative=self).count()
-        return w if w else 0
-
     def get_data(self, user=False):
         if not hasattr(self, '_data'):
             self.fill_data(user)
@@ -377,7 +418,7 @@ class Alternative(models.Model):
         self.comments = Comment.objects.filter(alternative=self).order_by('created')
         self.total_ideas = self.idea.all().count()
         # Votes
-        self.votes = self.vote_count()
+        self.votes = self.vote_count
         if user and user.is_authenticated():
             vote = get_object_or_none(Vote, alternative=self, author=user)
         else:
@@ -388,40 +429,35 @@ class Alternative(models.Model):
         self.vote_average = '%2.d%%' % self.vote_average if self.vote_average else '0%'
         self.vote_objects = Vote.objects.filter(alternative=self).order_by('-value')
         # Criteria
-        self.results = dict()
-        for c in self.problem.criteria_set.order_by('name').all():
-            c.get_data()
-            self.fmt = c.fmt
-            c.ideas = list()
-            c.result_value = 0
-            self.results[c.id] = c
-            if self.idea.count() == 0:
-                continue
-            for i in self.idea.all():
-                ic = get_object_or_none(IdeaCriteria, idea=i, criteria=c)
-                i.value = ic.get_value() if ic else 0
-                c.ideas.append(i)
-                weight = getattr(c, 'weight')
-                weight = weight if weight else 1
-                self.results[c.id].criteria_name = c.name
-
-                # Just sum for sums or averages
-                if c.result == 'sum' or c.result == 'average':
-                    self.results[c.id].result_value += i.value * weight
-
-                # Absolute results depend on value ordering
-                elif c.result == 'absolute' and c.order == 'asc':
-                    self.results[c.id].result_value = i.value \
-                        if i.value > self.results[c.id].result_value \
-                        else self.results[c.id].result_value
-                elif c.result == 'absolute' and c.order == 'desc':
-                    self.results[c.id].result_value = i.value \
-                        if i.value < self.results[c.id].result_value \
-                        else self.results[c.id].result_value
-
-            # Finish the average
-            if c.result == 'average':
-                self.results[c.id].result_value = self.results[c.id].result_value / self.idea.count()
+        from dnstorm.app.results import StrategyTable
+        table = StrategyTable.for_problem(self.problem)
+        self.results = table.alternative_results(self)
+        self.fmt = table.criteria[-1].fmt if table.criteria else None
+
+class Result(models.Model):
+    """
+    Stored result of an alternative for a criteria, as presented in the
+    results tab of the problem. Rows are kept updated by
+    ``dnstorm.app.results.update_results`` every time the strategy table
+    changes.
+    """
+    problem = models.ForeignKey(Problem, editable=False)
+    alternative = models.ForeignKey(Alternative, editable=False)
+    criteria = models.ForeignKey(Criteria, editable=False, related_name='results')
+    value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    updated = models.DateTimeField(auto_now=True, editable=False, default='2000-01-01')
+
+    class Meta:
+        db_table = settings.DNSTORM['table_prefix'] + '_result'
+        unique_together = ('alternative', 'criteria')
+
+    def type(self):
+        return _('result')
+
+    def get_value(self):
+        if self.criteria.fmt in ['currency']:
+            return self.value
+        return int(self.value)
 
 class Comment(models.Model):
     """
@@ -475,3 +511,120 @@ class Invitation(models.Model):
 
     def get_absolute_url(self):
         return 'http://%s%s?hash=%s' % (Site.objects.get_current(), reverse('registration_register'), self.hash)
+
+class ActivityCounter(models.Model):
+    """
+    Counter of new activities for the problems a user is following, displayed
+    in the top bar. It gets incremented for all the followers at once by
+    ``dnstorm.app.utils.activity_count``.
+    """
+    user = models.OneToOneField(User, editable=False, related_name='activity_counter')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = settings.DNSTORM['table_prefix'] + '_activity_counter'
+
+    def type(self):
+        return _('activity_counter')
+
+class Job(models.Model):
+    """
+    Background job stored in a database queue and processed by the
+    ``run_jobs`` management command. Jobs with the same ``key`` that are
+    pending at the same time are run only once, for the last one enqueued.
+    """
+    name = models.CharField(max_length=60)
+    key = models.CharField(max_length=255, blank=True, db_index=True)
+    data = models.TextField(blank=True)
+    status = models.CharField(max_length=10, default='pending', db_index=True, choices=(
+        ('pending', _('Pending')),
+        ('running', _('Running')),
+        ('done', _('Done')),
+        ('failed', _('Failed')),
+    ))
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    created = models.DateTimeField(auto_now_add=True, editable=False, default='2000-01-01')
+    updated = models.DateTimeField(auto_now=True, editable=False, default='2000-01-01')
+
+    class Meta:
+        db_table = settings.DNSTORM['table_prefix'] + '_job'
+
+    def type(self):
+        return _('job')
+
+class UserStats(models.Model):
+    """
+    Contributions of a user displayed in the badges of ``item_user.html``:
+    published problems and ideas and comments. Kept by
+    ``dnstorm.app.counters`` and read with ``dnstorm.app.utils.user_stats``.
+    """
+    user = models.OneToOneField(User, editable=False, related_name='stats')
+    problem_count = models.PositiveIntegerField(default=0)
+    idea_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = settings.DNSTORM['table_prefix'] + '_user_stats'
+
+    def type(self):
+        return _('user_stats')
+
+class UserSearchKey(models.Model):
+    """
+    Normalized tokens of the username, names and e-mail of a user, and the
+    trigrams of these tokens, searched by ``dnstorm.app.user_index`` for the
+    collaborators autocomplete instead of the user table.
+    """
+    user = models.ForeignKey(User, editable=False, related_name='search_keys')
+    key = models.CharField(max_length=75, db_index=True)
+    trigram = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = settings.DNSTORM['table_prefix'] + '_user_search_key'
+
+    def type(self):
+        return _('user_search_key')
+
+class SearchTerm(models.Model):
+    """
+    Inverted index of the problems, criteria, ideas and comments for the site
+    search. Each row gives the weight of a term in an object, identified by
+    its ``kind`` and ``object_id``, and the problem it belongs to. Kept by
+    ``dnstorm.app.search``.
+    """
+    term = models.CharField(max_length=40, db_index=True)
+    kind = models.CharField(max_length=10)
+    object_id = models.PositiveIntegerField()
+    problem = models.ForeignKey(Problem, editable=False)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        db_table = settings.DNSTORM['table_prefix'] + '_search_term'
+        index_together = [['kind', 'object_id']]
+
+    def type(self):
+        return _('search_term')
+
+class StreamEvent(models.Model):
+    """
+    Events of a problem pushed to its followers by the ``stream`` view, like
+    activity counter increments and new comments, with their JSON ``data``.
+    Published by ``dnstorm.app.stream`` and kept for the ``stream_event_ttl``
+    setting.
+    """
+    problem = models.ForeignKey(Problem, editable=False)
+    user = models.ForeignKey(User, editable=False, blank=True, null=True)
+    kind = models.CharField(max_length=20)
+    data = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
+    class Meta:
+        db_table = settings.DNSTORM['table_prefix'] + '_stream_event'
+
+    def type(self):
+        return _('stream_event')
+
+# Invalidation of the cached fragments and indexing of the objects above
+from dnstorm.app import fragments, search, user_index
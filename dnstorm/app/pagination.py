@@ -0,0 +1,152 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+class CursorPage(object):
+    """
+    A page of a ``CursorPaginator``, usable in templates the same way as a
+    ``django.core.paginator.Page``.
+    """
+
+    def __init__(self, object_list, number, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+class CursorPaginator(object):
+    """
+    Keyset paginator ordering the queryset by a field and the primary key.
+    Pages are fetched filtering by the values of the last or first object of
+    the current page, given in an opaque cursor, so the cost of a page does
+    not depend on how deep it is.
+
+    Attributes:
+        * ``ordering`` field name prefixed with ``-`` for descending order
+        * ``count_limit`` maximum number of objects counted by ``count``
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_limit=1000):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+        self.count_limit = count_limit
+
+    def encode(self, obj, direction, number):
+        value = getattr(obj, self.field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        cursor = json.dumps([direction, value, obj.pk, number], separators=(',', ':'))
+        return base64.urlsafe_b64encode(cursor).rstrip('=')
+
+    def decode(self, cursor):
+        """
+        Returns the direction, field value, primary key and page number given
+        in the cursor, or ``None`` for an invalid one.
+        """
+        try:
+            cursor = str(cursor)
+            direction, value, pk, number = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except (TypeError, ValueError, UnicodeEncodeError):
+            return None
+        if direction not in ['next', 'prev'] or not isinstance(number, int):
+            return None
+        if isinstance(value, basestring) and parse_datetime(value):
+            value = parse_datetime(value)
+        return direction, value, pk, number
+
+    def page(self, cursor=None):
+        """
+        Returns the page after or before the object given in the cursor, or
+        the first page when no valid cursor is given.
+        """
+        direction, value, pk, number = (cursor and self.decode(cursor)) or ('next', None, None, 0)
+        forward = direction == 'next'
+        queryset = self.queryset
+        if pk is not None:
+            lookup = 'lt' if self.descending == forward else 'gt'
+            queryset = queryset.filter(
+                Q(**{'%s__%s' % (self.field, lookup): value}) |
+                Q(**{self.field: value, 'pk__%s' % lookup: pk}))
+        descending = self.descending == forward
+        ordering = ['-%s' % self.field, '-pk'] if descending else [self.field, 'pk']
+        object_list = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if not forward:
+            if not object_list:
+                return self.page()
+            object_list.reverse()
+            number = max(number - 1, 1)
+            has_next, has_previous = True, more
+        else:
+            number = number + 1
+            has_next, has_previous = more, pk is not None
+
+        return CursorPage(object_list, number, self,
+            self.encode(object_list[-1], 'next', number) if has_next and object_list else None,
+            self.encode(object_list[0], 'prev', number) if has_previous and object_list else None)
+
+    @property
+    def count(self):
+        """
+        Number of objects counted up to ``count_limit``.
+        """
+        if not hasattr(self, '_count'):
+            self._count = self.queryset.order_by().values('pk')[:self.count_limit].count()
+        return self._count
+
+    @property
+    def count_display(self):
+        """
+        The ``count`` with a ``+`` sign when it reached the ``count_limit``.
+        """
+        return '%d+' % self.count if self.count >= self.count_limit else self.count
+
+class ListPaginator(object):
+    """
+    Paginator for lists ranked in memory, like search results, which can't be
+    filtered by the values of a cursor. The cursor is the page number.
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        try:
+            number = max(int(cursor), 1)
+        except (TypeError, ValueError):
+            number = 1
+        start = (number - 1) * self.per_page
+        object_list = self.object_list[start:start + self.per_page]
+        if not object_list and number > 1:
+            return self.page()
+        return CursorPage(object_list, number, self,
+            str(number + 1) if start + self.per_page < len(self.object_list) else None,
+            str(number - 1) if number > 1 else None)
+
+    @property
+    def count(self):
+        return len(self.object_list)
@@ -1,4 +1,85 @@
+from functools import wraps
 
+def get_cache(user):
+    """
+    Permissions cache stored in the user object, which is created again for
+    every request. Attributes are read with ``getattr`` so they reach the
+    user wrapped by the lazy ``request.user``.
+    """
+    cache = getattr(user, '_perms', None)
+    if cache is None:
+        cache = user._perms = dict()
+    return cache
+
+def memoize(function):
+    """
+    Memoizes the decisions of a permission function by mode and object for
+    the given user.
+    """
+    @wraps(function)
+    def wrapper(user, mode, obj=None):
+        if not user or (obj is not None and obj.pk is None):
+            return function(user, mode, obj)
+        key = (function.__name__, mode, obj.__class__.__name__, getattr(obj, 'pk', None))
+        cache = get_cache(user)
+        if key not in cache:
+            cache[key] = function(user, mode, obj)
+        return cache[key]
+    return wrapper
+
+def is_author(user, obj):
+    return bool(user) and obj.author_id == user.id
+
+def is_collaborator(user, problem):
+    """
+    Checks with a single ``EXISTS`` query if the user is a collaborator of the
+    problem, just once for each problem.
+    """
+    if not user or not user.is_authenticated():
+        return False
+    key = ('collaborator', problem.pk)
+    cache = get_cache(user)
+    if key not in cache:
+        cache[key] = problem.collaborator.filter(id=user.id).exists()
+    return cache[key]
+
+def problem_list(user, problems):
+    """
+    Permissions for a list of problems, like a page of the home listing. The
+    collaborations of the user are fetched for all the problems in a single
+    query, then the flags for each mode are set in a ``perms`` dict in every
+    problem. Returns a dict of these flags by problem id.
+    """
+    problems = list(problems)
+    if user and user.is_authenticated():
+        from dnstorm.app.models import Problem
+        collaborating = set(Problem.collaborator.through.objects.filter(
+            user=user, problem__in=[p.id for p in problems]).values_list('problem', flat=True))
+        cache = get_cache(user)
+        for p in problems:
+            cache[('collaborator', p.pk)] = p.pk in collaborating
+    flags = dict()
+    for p in problems:
+        p.perms = dict((mode, problem(user, mode, p)) for mode in ['view', 'update', 'delete', 'comment', 'manage'])
+        flags[p.id] = p.perms
+    return flags
+
+def problem_filter(user):
+    """
+    Filter of the problems the user can view, the same decision of ``problem``
+    for the ``view`` mode made by the database.
+    """
+    from django.db.models import Q
+    from dnstorm.app.models import Problem
+    if user.is_superuser:
+        return Q()
+    q = Q(published=True, public=True)
+    if user.is_authenticated():
+        q |= Q(published=True, id__in=Problem.collaborator.through.objects.filter(user=user).values('problem')) | \
+            Q(author=user)
+    return q
+
+@memoize
 def problem(user, mode, obj=None):
     """
     Regulate permissions for problem objects.
@@ -12,28 +93,29 @@ def problem(user, mode, obj=None):
             user.is_authenticated()
         and (
             (obj.published and obj.public and obj.open) or \
-            (obj.published and obj.open and user in obj.collaborator.all()) or \
-            (obj.author == user)
+            (obj.published and obj.open and is_collaborator(user, obj)) or \
+            is_author(user, obj)
         ))
     elif mode == 'delete':
-        return (obj.author == user)
+        return is_author(user, obj)
     elif mode == 'view':
         return (
             (obj.published and obj.public) or \
-            (obj.published and user in obj.collaborator.all()) or \
-            (obj.author == user)
+            (obj.published and is_collaborator(user, obj)) or \
+            is_author(user, obj)
         )
     elif mode in ['comment', 'vote']:
         return (
             user.is_authenticated()
         ) and (
             (obj.published and obj.public) or \
-            (obj.published and user in obj.collaborator.all()) or \
-            (obj.author == user)
+            (obj.published and is_collaborator(user, obj)) or \
+            is_author(user, obj)
         )
     elif mode == 'manage':
-        return obj.author == user
+        return is_author(user, obj)
 
+@memoize
 def criteria(user, mode, obj):
     """
     Regulate permissions for criteria objects.
@@ -46,8 +128,8 @@ def criteria(user, mode, obj):
             and obj.published
         ) and (
             (obj.open and obj.public) or \
-            (obj.open and user in obj.collaborator.all()) or \
-            (obj.author == user)
+            (obj.open and is_collaborator(user, obj)) or \
+            is_author(user, obj)
         )
     elif mode == 'update':
         return (
@@ -55,15 +137,16 @@ def criteria(user, mode, obj):
             and obj.problem.published
         ) and (
             obj.problem.public and obj.problem.open or \
-            obj.problem.open and user in obj.problem.collaborator.all() or \
-            obj.problem.author == user or \
-            obj.author == user
+            obj.problem.open and is_collaborator(user, obj.problem) or \
+            is_author(user, obj.problem) or \
+            is_author(user, obj)
         )
     elif mode == 'delete':
         return (
-            obj.author == user or \
-            obj.problem.author == user)
+            is_author(user, obj) or \
+            is_author(user, obj.problem))
 
+@memoize
 def idea(user, mode, obj):
     """
     Regulate permissions for idea objects.
@@ -75,12 +158,12 @@ def idea(user, mode, obj):
             user and \
             user.is_authenticated() and \
             obj.published and \
-            obj.criteria_set.count() > 0
+            obj.criteria_set.exists()
         ) and (
             user and \
             (obj.open) or \
-            (user == obj.author) or \
-            (user in obj.collaborator.all())
+            is_author(user, obj) or \
+            (is_collaborator(user, obj))
         )
     elif mode == 'vote':
         return (
@@ -91,7 +174,7 @@ def idea(user, mode, obj):
         ) and (
             user and \
             obj.problem.open or \
-            user in obj.problem.collaborator.all()
+            is_collaborator(user, obj.problem)
         )
     elif mode == 'update':
         return (
@@ -100,13 +183,14 @@ def idea(user, mode, obj):
         ) and (
             user and \
             (obj.problem.published and obj.problem.open) or \
-            (user == obj.author) or \
-            (user == obj.problem.author)
+            is_author(user, obj) or \
+            is_author(user, obj.problem)
         )
     elif mode == 'delete':
-        return (user == obj.author or \
-            user == obj.problem.author)
+        return (is_author(user, obj) or \
+            is_author(user, obj.problem))
 
+@memoize
 def alternative(user, mode, obj):
     """
     Regulate permissions for alternative objects.
@@ -118,12 +202,12 @@ def alternative(user, mode, obj):
             user and \
             user.is_authenticated() and \
             obj.published and \
-            obj.idea_set.count() > 0
+            obj.idea_set.exists()
         ) and (
             user and \
             (obj.open) or \
-            (user == obj.author) or \
-            (user in obj.collaborator.all())
+            is_author(user, obj) or \
+            (is_collaborator(user, obj))
         )
     elif mode == 'update':
         return (
@@ -133,11 +217,11 @@ def alternative(user, mode, obj):
         ) and (
             user and \
             (obj.problem.open and obj.problem.public) or \
-            (obj.problem.open and user in obj.problem.collaborator.all()) or \
-            (user == obj.author) or \
-            (user == obj.problem.author)
+            (obj.problem.open and is_collaborator(user, obj.problem)) or \
+            is_author(user, obj) or \
+            is_author(user, obj.problem)
         )
     elif mode == 'delete':
-        return (user == obj.author or \
-            user == obj.problem.author)
+        return (is_author(user, obj) or \
+            is_author(user, obj.problem))
     return False
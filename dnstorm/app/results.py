@@ -0,0 +1,236 @@
+import copy
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from dnstorm.app.models import Alternative, Criteria, Idea, IdeaCriteria, Result
+from dnstorm.app.utils import load_tooltips
+
+VALUE_FIELDS = ('value_number', 'value_currency', 'value_scale', 'value_time', 'value_boolean')
+
+def cast_value(fmt, row):
+    """
+    Same conversion made by ``IdeaCriteria.get_value`` but over a raw
+    ``values_list`` row ordered as ``VALUE_FIELDS``.
+    """
+    v = row[VALUE_FIELDS.index('value_%s' % fmt)]
+    if fmt == 'currency':
+        return v if v is not None else 0
+    try:
+        return int(v)
+    except:
+        return 0
+
+class StrategyTable(object):
+    """
+    Results engine for the strategy table of a problem. All the
+    ``IdeaCriteria`` values of the problem are loaded at once into a dense
+    idea x criteria matrix, and the results of the alternatives are computed
+    from it without any other query.
+
+    Attributes:
+        * ``criteria`` list of criteria ordered by name
+        * ``ideas`` dict of ideas by id
+        * ``alternative_ideas`` dict of lists of idea ids by alternative id
+    """
+
+    def __init__(self, problem, data=None):
+        self.problem = problem
+        if data is None:
+            self.load()
+        else:
+            self.build(*data)
+
+    @classmethod
+    def for_problem(cls, problem):
+        """
+        Returns the table cached in the problem instance, so alternatives
+        sharing the same problem object will reuse it.
+        """
+        if not hasattr(problem, '_strategy_table'):
+            problem._strategy_table = cls(problem)
+        return problem._strategy_table
+
+    @classmethod
+    def for_problems(cls, problems):
+        """
+        Tables of many problems loaded with a single query for each relation,
+        as a dict by problem id. Descriptions of the ideas are left out.
+        """
+        ids = [p.id for p in problems]
+        data = dict((i, (list(), list(), list(), list())) for i in ids)
+        for c in Criteria.objects.filter(problem__in=ids).order_by('name'):
+            data[c.problem_id][0].append(c)
+        for i in Idea.objects.filter(problem__in=ids).defer('description'):
+            data[i.problem_id][1].append(i)
+        for row in Alternative.idea.through.objects.filter(alternative__problem__in=ids) \
+            .values_list('alternative__problem', 'alternative', 'idea').order_by('idea'):
+            data[row[0]][2].append(row[1:])
+        for row in IdeaCriteria.objects.filter(criteria__problem__in=ids) \
+            .values_list('criteria__problem', 'idea', 'criteria', *VALUE_FIELDS):
+            data[row[0]][3].append(row[1:])
+        return dict((p.id, cls(p, data[p.id])) for p in problems)
+
+    def load(self):
+        self.build(self.problem.criteria_set.order_by('name'),
+            Idea.objects.filter(problem=self.problem),
+            Alternative.idea.through.objects.filter(alternative__problem=self.problem) \
+                .values_list('alternative', 'idea').order_by('idea'),
+            IdeaCriteria.objects.filter(criteria__problem=self.problem) \
+                .values_list('idea', 'criteria', *VALUE_FIELDS))
+
+    def build(self, criteria, ideas, alternative_ideas, values):
+        """
+        Builds the table from the criteria ordered by name, the ideas, the
+        ``(alternative, idea)`` pairs ordered by idea and the ``(idea,
+        criteria, *VALUE_FIELDS)`` rows of the problem.
+        """
+        self.criteria = list(criteria)
+        self.criteria_index = dict((c.id, n) for n, c in enumerate(self.criteria))
+        self.ideas = dict((i.id, i) for i in ideas)
+        self.idea_index = dict((i, n) for n, i in enumerate(sorted(self.ideas)))
+
+        # Alternative and ideas relationship
+        self.alternative_ideas = dict()
+        for a, i in alternative_ideas:
+            if i in self.ideas:
+                self.alternative_ideas.setdefault(a, list()).append(i)
+
+        # Values matrix, ideas as rows and criteria as columns
+        width = len(self.criteria)
+        self.matrix = [0] * (width * len(self.idea_index))
+        for row in values:
+            if row[0] not in self.idea_index or row[1] not in self.criteria_index:
+                continue
+            c = self.criteria_index[row[1]]
+            self.matrix[self.idea_index[row[0]] * width + c] = cast_value(self.criteria[c].fmt, row[2:])
+
+    def value(self, idea_id, criteria_id):
+        """
+        Value given by an idea to a criteria, ``0`` when not set.
+        """
+        if idea_id not in self.idea_index or criteria_id not in self.criteria_index:
+            return 0
+        return self.matrix[self.idea_index[idea_id] * len(self.criteria) + self.criteria_index[criteria_id]]
+
+    def column(self, criteria, idea_ids):
+        """
+        Values of a criteria for the given ideas.
+        """
+        return [self.value(i, criteria.id) for i in idea_ids]
+
+    def result(self, criteria, idea_ids):
+        """
+        Computes the result of a set of ideas for a criteria accordingly to
+        its ``result``, ``order`` and ``weight`` parameters.
+        """
+        values = self.column(criteria, idea_ids)
+        if not values:
+            return 0
+        weight = criteria.weight if criteria.weight else 1
+        if criteria.result in ['sum', 'average']:
+            result = sum([v * weight for v in values])
+            if criteria.result == 'average':
+                result = result / len(values)
+        elif criteria.result == 'absolute' and criteria.order == 'asc':
+            result = max([0] + values)
+        elif criteria.result == 'absolute' and criteria.order == 'desc':
+            result = min([0] + values)
+        else:
+            result = 0
+        return result
+
+    def alternative_results(self, alternative):
+        """
+        Results for each criteria of an alternative. Returns a dict of criteria
+        objects by id filled with ``result_value`` and the ``ideas`` with their
+        values, as expected by the ``item_alternative.html`` template.
+        """
+        idea_ids = self.alternative_ideas.get(alternative.id, list())
+        load_tooltips(self.criteria)
+        results = dict()
+        for c in self.criteria:
+            c = copy.copy(c)
+            c.ideas = list()
+            for i in idea_ids:
+                idea = copy.copy(self.ideas[i])
+                idea.value = self.value(i, c.id)
+                c.ideas.append(idea)
+            c.criteria_name = c.name
+            c.result_value = self.result(c, idea_ids)
+            results[c.id] = c
+        return results
+
+def update_results(problem, alternatives=None, criteria=None):
+    """
+    Updates the stored ``Result`` rows of a problem. Only the results for the
+    given lists of alternative and criteria ids are recomputed, being all of
+    them when not given. Rows are written only when their values changed.
+    """
+    table = StrategyTable(problem)
+    if alternatives is None:
+        alternatives = Alternative.objects.filter(problem=problem).values_list('id', flat=True)
+    alternatives = set(alternatives)
+    criteria = [c for c in table.criteria if criteria is None or c.id in criteria]
+    if not alternatives or not criteria:
+        return
+
+    stored = dict(((r.alternative_id, r.criteria_id), r) for r in Result.objects.filter(
+        problem=problem, alternative__in=alternatives, criteria__in=criteria))
+    created = list()
+    for a in alternatives:
+        for c in criteria:
+            value = Decimal(table.result(c, table.alternative_ideas.get(a, list()))).quantize(Decimal('0.01'))
+            r = stored.get((a, c.id))
+            if not r:
+                created.append(Result(problem=problem, alternative_id=a, criteria=c, value=value))
+            elif r.value != value:
+                Result.objects.filter(id=r.id).update(value=value, updated=timezone.now())
+    sid = transaction.savepoint()
+    try:
+        Result.objects.bulk_create(created)
+    except IntegrityError:
+        # Another request stored some of the same rows first. Savepoints are
+        # a no-op on sqlite, where the batches inserted before the failed one
+        # are kept, so each row is got or created instead of assuming the
+        # rollback left none of them
+        transaction.savepoint_rollback(sid)
+        for r in created:
+            result, new = Result.objects.get_or_create(alternative_id=r.alternative_id,
+                criteria_id=r.criteria_id, defaults={'problem': problem, 'value': r.value})
+            if not new and result.value != r.value:
+                Result.objects.filter(id=result.id).update(value=r.value, updated=timezone.now())
+    else:
+        transaction.savepoint_commit(sid)
+
+def complete_results(problems):
+    """
+    Stores all the results of the problems whose ``Result`` rows don't cover
+    every alternative and criteria pair, checked with a query for each model.
+    """
+    def counts(model):
+        return dict(model.objects.filter(problem__in=problems).values_list('problem') \
+            .annotate(count=Count('id')).order_by())
+    alternatives, criteria, stored = counts(Alternative), counts(Criteria), counts(Result)
+    for p in problems:
+        if stored.get(p.id, 0) < alternatives.get(p.id, 0) * criteria.get(p.id, 0):
+            update_results(p)
+
+def stored_criteria_results(problem):
+    """
+    Results of all the alternatives for each criteria read from the stored
+    ``Result`` rows, as expected by the results tab of the problem. Missing
+    rows are stored first by ``complete_results``.
+    """
+    complete_results([problem])
+    criteria_results = list()
+    for r in Result.objects.filter(problem=problem) \
+        .select_related('criteria', 'alternative') \
+        .order_by('criteria__name', 'criteria', '-alternative__name'):
+        if not criteria_results or criteria_results[-1]['criteria'].id != r.criteria_id:
+            criteria_results.append({'criteria': r.criteria, 'alternatives': list()})
+        r.alternative.value = r.get_value()
+        criteria_results[-1]['alternatives'].append(r.alternative)
+    return criteria_results
@@ -0,0 +1,168 @@
+from collections import defaultdict
+from HTMLParser import HTMLParser
+
+from django.db.models import Sum, signals
+
+from dnstorm import settings
+from dnstorm.app import perms
+from dnstorm.app.models import Comment, Criteria, Idea, Problem, SearchTerm
+from dnstorm.app.templatetags.remove_tags import remove_tags
+from dnstorm.app.utils import tokenize
+
+# Indexed fields of each model with the weight of their terms
+FIELDS = {
+    Problem: [('title', 3), ('description', 1)],
+    Criteria: [('name', 3), ('description', 1)],
+    Idea: [('title', 3), ('description', 1)],
+    Comment: [('content', 1)],
+}
+KINDS = dict((model.__name__.lower(), model) for model in FIELDS)
+
+# Relations of each model used to display the results
+RELATED = {
+    Problem: ['author'],
+    Criteria: ['problem', 'author'],
+    Idea: ['problem', 'author'],
+    Comment: ['problem', 'author', 'criteria__problem', 'idea__problem', 'alternative__problem'],
+}
+
+# Most terms read from a query
+MAX_TERMS = 6
+
+def kind(obj):
+    return obj.__class__.__name__.lower()
+
+def problem_id(obj):
+    """
+    Id of the problem of an indexed object, which is the one of the object
+    commented for comments.
+    """
+    if isinstance(obj, Problem):
+        return obj.id
+    elif isinstance(obj, Comment):
+        if obj.problem_id:
+            return obj.problem_id
+        for f in ['criteria', 'idea', 'alternative']:
+            if getattr(obj, '%s_id' % f):
+                return getattr(obj, f).problem_id
+        return None
+    return obj.problem_id
+
+def text(obj, field):
+    """
+    Content of a field without HTML tags and entities.
+    """
+    return HTMLParser().unescape(remove_tags(getattr(obj, field) or ''))
+
+def postings(obj):
+    """
+    Weights of the terms of an object: the times each term appears in a field
+    multiplied by the weight of the field.
+    """
+    weights = defaultdict(int)
+    for field, weight in FIELDS[obj.__class__]:
+        for t in tokenize(text(obj, field)):
+            if len(t) > 1:
+                weights[t[:40]] += weight
+    return weights
+
+def entries(obj):
+    """
+    Index rows of an object. Unpublished ideas aren't indexed.
+    """
+    pid = problem_id(obj)
+    if not pid or (isinstance(obj, Idea) and not obj.published):
+        return []
+    return [SearchTerm(term=t, kind=kind(obj), object_id=obj.id, problem_id=pid, weight=min(w, 32767))
+        for t, w in postings(obj).items()]
+
+def update(obj):
+    """
+    Replaces the rows of the object in the index.
+    """
+    SearchTerm.objects.filter(kind=kind(obj), object_id=obj.id).delete()
+    SearchTerm.objects.bulk_create(entries(obj))
+
+def add(objs, batch=1000):
+    """
+    Indexes new objects, inserting the rows in batches.
+    """
+    rows = list()
+    for obj in objs:
+        rows.extend(entries(obj))
+        if len(rows) >= batch:
+            SearchTerm.objects.bulk_create(rows)
+            rows = list()
+    SearchTerm.objects.bulk_create(rows)
+
+def rebuild(batch=1000):
+    """
+    Indexes all the problems, criteria, ideas and comments again.
+    """
+    SearchTerm.objects.all().delete()
+    for model in FIELDS:
+        qs = model.objects.order_by('id')
+        if model == Comment:
+            qs = qs.select_related('criteria', 'idea', 'alternative')
+        add(qs.iterator(), batch)
+
+def search(user, q):
+    """
+    Objects of the problems the user can view matching all the terms of the
+    query, as prefixes of the indexed terms. Returns a list of ``(kind, id,
+    score)`` tuples ranked by the sum of the weights of the terms matched,
+    then by the newest objects, limited by the ``search_max_results``
+    setting.
+    """
+    terms = [t[:40] for t in tokenize(q) if len(t) > 1][:MAX_TERMS]
+    qs = SearchTerm.objects.all()
+    if not user.is_superuser:
+        qs = qs.filter(problem__in=Problem.objects.filter(perms.problem_filter(user)).values('id'))
+    scores = None
+    for term in terms:
+        rows = qs.filter(term__startswith=term).values_list('kind', 'object_id') \
+            .annotate(score=Sum('weight')).order_by()
+        s = dict(((k, i), score) for k, i, score in rows)
+        scores = s if scores is None else dict((o, scores[o] + v) for o, v in s.items() if o in scores)
+        if not scores:
+            return []
+    results = sorted(scores.items(), key=lambda r: (-r[1], -r[0][1]))
+    return [(k, i, score) for (k, i), score in results[:settings.DNSTORM.get('search_max_results', 500)]]
+
+def load(results):
+    """
+    Objects of a page of results, with the ``result_*`` attributes used in
+    ``_search.html``.
+    """
+    ids = defaultdict(list)
+    for k, i, score in results:
+        ids[k].append(i)
+    objs = dict()
+    for k, model in KINDS.items():
+        if ids[k]:
+            qs = model.objects.select_related(*RELATED[model])
+            objs.update(((k, i), o) for i, o in qs.in_bulk(ids[k]).items())
+    loaded = list()
+    for k, i, score in results:
+        o = objs.get((k, i))
+        if not o:
+            continue
+        o.result_kind, o.result_score = k, score
+        o.result_problem = o if k == 'problem' else o.problem or \
+            (o.criteria or o.idea or o.alternative).problem
+        o.result_title = getattr(o, 'title', None) or getattr(o, 'name', None) or o.result_problem.title
+        o.result_text = text(o, 'content' if k == 'comment' else 'description')
+        o.result_url = '%s#comment-%d' % (o.result_problem.get_absolute_url(), o.id) if k == 'comment' else o.get_absolute_url()
+        loaded.append(o)
+    return loaded
+
+def index(sender, instance, update_fields=None, **kwargs):
+    if sender in FIELDS and (not update_fields or set(update_fields) & set(f for f, w in FIELDS[sender] + [('published', 0)])):
+        update(instance)
+
+def unindex(sender, instance, **kwargs):
+    if sender in FIELDS:
+        SearchTerm.objects.filter(kind=kind(instance), object_id=instance.id).delete()
+
+signals.post_save.connect(index, dispatch_uid='dnstorm_search_save')
+signals.post_delete.connect(unindex, dispatch_uid='dnstorm_search_delete')
@@ -181,6 +181,31 @@ function activity_reset_counter() {
     }
 }
 
+function activity_stream() {
+    /***
+    Listens to the server-sent events of the problems followed by the user
+    and of the problem being viewed, updating the activity counter and
+    showing new comments without reloading the page.
+    ***/
+    var viewing = typeof problem_id != 'undefined';
+    if (!window.EventSource || (!viewing && !$('.notification-icon').length)) {
+        return;
+    }
+    var source = new EventSource('/stream/' + (viewing ? '?problem=' + problem_id : ''));
+    source.addEventListener('activity', function(e){
+        var activity_counter = $('.notification .counter');
+        activity_counter.text((parseInt(activity_counter.text()) || 0) + 1);
+        $('.notification').addClass('alert');
+    });
+    source.addEventListener('comment', function(e){
+        var response = JSON.parse(e.data);
+        var target = $(response.target);
+        target.append(response.html);
+        target.find('.comment').last().highlight();
+    });
+}
+$(document).ready(activity_stream);
+
 $(document).on('click', '.drafts-icon', function(e){
     /***
     Show and hide the drafts box.
@@ -302,29 +327,85 @@ function criteria_value() {
 $('.criteria form').on('change', 'select[name="fmt"]', criteria_value);
 $('.criteria form').ready(criteria_value);
 
+var user_search_cache = {};
+var user_search_queue = [];
+var user_search_timer = null;
 var user_searching = false;
-$('input#id_user_search').on('keyup', function(){
-    if ($(this).val().length < 3 || user_searching) {
+
+function user_search_render(users) {
+    /***
+    Renders the users returned by the user search like ``item_user.html``.
+    ***/
+    var result = $('.user-search-result').empty();
+    $.each(users, function(i, u){
+        var box = $('<div class="user-box enclosed"></div>').attr('data-username', u.username);
+        if (u.status != 'staff') {
+            box.addClass('pending-user');
+        }
+        if (u.status == 'inactive') {
+            box.addClass('inactive-user');
+        }
+        if (u.email) {
+            box.attr('data-email', u.email);
+        }
+        var avatar = $('<a class="avatar left" href="javascript:void(0)"></a>');
+        if (u.avatar) {
+            avatar.append($('<img width="32" height="32"/>').attr('src', u.avatar).attr('alt', u.username));
+        } else {
+            avatar.append('<i class="fi-' + (u.status == 'inactive' ? 'prohibited' : 'mail') + '"></i>');
+        }
+        var info = $('<div class="info"></div>')
+            .append($('<a class="username" href="javascript:void(0)"></a>').text(u.name));
+        if (u.label) {
+            info.append(' ').append($('<span class="label secondary small"></span>').text(u.label));
+        }
+        result.append(box.append($('<div class="row collapse"></div>')
+            .append($('<div class="columns large-12"></div>').append(avatar).append(info))));
+    });
+    result.show();
+}
+
+function user_search() {
+    /***
+    Looks up the last queued queries in a single request, one request at a
+    time, and renders the results for the current value of the field.
+    ***/
+    var field = $('input#id_user_search');
+    var button = $('#button-id-add_user');
+    if (field.val() in user_search_cache) {
+        user_search_render(user_search_cache[field.val()]);
+    }
+    if (user_searching || !user_search_queue.length) {
         return;
     }
-    var button = $('#button-id-add_user');
     user_searching = true;
-    var field = $(this);
     button.addClass('loading');
     $.ajax({
         url: '/ajax/',
         type: 'GET',
-        data: 'user_search=' + $(this).val(),
+        traditional: true,
+        data: {'user_search': user_search_queue.splice(0, user_search_queue.length).slice(-5)},
         complete: function(xhr, data) {
-            field.removeClass('loading');
+            user_searching = false;
+            button.removeClass('loading');
             if (data == 'success') {
-                response = JSON.parse(xhr.responseText);
-                $('.user-search-result').html(response.result).show();
-                user_searching = false;
-                button.removeClass('loading');
+                $.extend(user_search_cache, JSON.parse(xhr.responseText).result);
             }
+            user_search();
         }
     });
+}
+
+$('input#id_user_search').on('keyup', function(){
+    var q = $(this).val();
+    if (q.length < 3) {
+        return;
+    }
+    if (!(q in user_search_cache) && $.inArray(q, user_search_queue) < 0) {
+        user_search_queue.push(q);
+    }
+    clearTimeout(user_search_timer);
+    user_search_timer = setTimeout(user_search, 250);
 });
 
 $('.problem-form').on('click', '.user-search-selected,.user-search-result a.username', function(e){
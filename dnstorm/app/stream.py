@@ -0,0 +1,81 @@
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from dnstorm import settings
+from dnstorm.app import perms
+from dnstorm.app.models import Problem, StreamEvent
+
+def publish(problem, kind, user=None, **data):
+    """
+    Stores an event of a problem to be pushed to the streams of its followers
+    and viewers, deleting the events older than the ``stream_event_ttl``
+    setting.
+    """
+    StreamEvent.objects.filter(created__lt=timezone.now() -
+        timedelta(seconds=settings.DNSTORM.get('stream_event_ttl', 60 * 10))).delete()
+    return StreamEvent.objects.create(problem_id=getattr(problem, 'id', problem),
+        user_id=getattr(user, 'id', user), kind=kind, data=json.dumps(data))
+
+def followed(user):
+    """
+    Ids of the problems followed by the user that the user can still view.
+    """
+    from actstream.models import Follow
+    if not user.is_authenticated():
+        return set()
+    ids = set(int(i) for i in Follow.objects.filter(user=user,
+        content_type=ContentType.objects.get_for_model(Problem)).values_list('object_id', flat=True))
+    if not ids:
+        return ids
+    return set(Problem.objects.filter(perms.problem_filter(user), id__in=ids).values_list('id', flat=True))
+
+def last_id():
+    return (StreamEvent.objects.order_by('-id').values_list('id', flat=True)[:1] or [0])[0]
+
+def events(user, followed, viewed, since):
+    """
+    Events after the ``since`` id of the problems followed by the user, and
+    the comments of the problems viewed. The comments of the user are left
+    out, as ``comment_new`` already shows them. Problems the user can't view
+    anymore are left out too, as the permissions may change while the stream
+    is open.
+    """
+    qs = StreamEvent.objects.filter(Q(problem__in=followed) | Q(problem__in=viewed, kind='comment'), id__gt=since,
+        problem__in=Problem.objects.filter(perms.problem_filter(user)).values('id'))
+    if user.is_authenticated():
+        qs = qs.exclude(kind='comment', user=user)
+    return list(qs.order_by('id')[:100])
+
+def message(event):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (event.id, event.kind, event.data)
+
+def stream(user, followed, viewed=None, since=None):
+    """
+    Server-sent events for a connection, starting after the ``since`` event
+    id or from now. The table is polled every ``stream_poll_interval``
+    seconds, closing the database connection between polls so the open
+    streams don't hold one each. A comment is sent every 15 seconds to keep
+    the connection alive, and the stream ends after the ``stream_timeout``
+    setting for the client to reconnect from the last event received.
+    """
+    interval = settings.DNSTORM.get('stream_poll_interval', 2)
+    since = last_id() if since is None else since
+    end = time.time() + settings.DNSTORM.get('stream_timeout', 55)
+    heartbeat = time.time()
+    yield 'retry: %d\n\n' % (interval * 1000)
+    while time.time() < end:
+        for event in events(user, followed, viewed or set(), since):
+            since = event.id
+            heartbeat = time.time()
+            yield message(event)
+        connection.close()
+        if time.time() - heartbeat >= 15:
+            heartbeat = time.time()
+            yield ':\n\n'
+        time.sleep(interval)
@@ -0,0 +1,56 @@
+from django import template
+from django.contrib.humanize.templatetags.humanize import naturaltime
+from django.core.cache import cache
+
+from dnstorm import settings
+from dnstorm.app import fragments
+
+register = template.Library()
+
+@register.tag(name='fragment')
+def do_fragment(parser, token):
+    """
+    Caches the contents of the block for an object prepared with
+    ``dnstorm.app.fragments.prepare``, varying on the other given values.
+    Objects without a ``fragment_key`` are always rendered.
+
+    {% fragment idea show_actions show_comments %} ... {% endfragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError("'fragment' tag requires an object.")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(b) for b in bits[2:]])
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, obj, vary_on):
+        self.nodelist = nodelist
+        self.obj = obj
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = getattr(self.obj.resolve(context, True), 'fragment_key', None)
+        if not key:
+            return self.nodelist.render(context)
+        key = fragments.cache_key(key, [v.resolve(context, True) for v in self.vary_on])
+        html = cache.get(key)
+        if html is None:
+            context.push()
+            context['fragment_cached'] = True
+            html = self.nodelist.render(context)
+            context.pop()
+            cache.set(key, html, settings.DNSTORM.get('fragment_cache_timeout', 60 * 10))
+        return fragments.fill(html)
+
+@register.simple_tag(takes_context=True)
+def live_naturaltime(context, date):
+    """
+    The ``naturaltime`` of a date, rendered every time the cached ``fragment``
+    it is in is used.
+
+    {% live_naturaltime comment.created %}
+    """
+    if context.get('fragment_cached'):
+        return fragments.live(date)
+    return naturaltime(date)
@@ -1,17 +1,18 @@
 import re
 from django.template import Library
-from dnstorm.app import models, perms
+from dnstorm.app import perms
+from dnstorm.app.utils import user_stats
 
 register = Library()
 
 def user_problem_count(user):
-    return models.Problem.objects.filter(author=user, published=True).count()
+    return user_stats(user).problem_count
 
 def user_idea_count(user):
-    return models.Idea.objects.filter(author=user, published=True).count()
+    return user_stats(user).idea_count
 
 def user_comment_count(user):
-    return models.Comment.objects.filter(author=user).count()
+    return user_stats(user).comment_count
 
 def problem_create(user):
     return perms.problem(user, 'create')
@@ -20,6 +20,15 @@ urlpatterns = patterns('',
     # Problems
     (r'^problems/collaborating/$', views.HomeView.as_view(), {}, 'problems_collaborating'),
     (r'^problems/drafts/$', views.HomeView.as_view(), {}, 'problems_drafts'),
+    (r'^problems/export/$', views.ExportView.as_view(), {}, 'problems_export'),
+
+    # API
+    (r'^api/v1/problems/$', views.ApiView.as_view(), {}, 'api_problems'),
+    (r'^api/v1/problems/(?P<pk>\d+)/$', views.ApiView.as_view(), {}, 'api_problem'),
+    (r'^api/v1/problems/(?P<pk>\d+)/(?P<collection>criteria|ideas|alternatives|results|comments)/$', views.ApiView.as_view(), {}, 'api_problem_collection'),
+
+    # Search
+    (r'^search/$', views.SearchView.as_view(), {}, 'search'),
 
     # Problem
     (r'^problems/create/$', views.ProblemCreateView.as_view(), {}, 'problem_create'),
@@ -73,9 +82,12 @@ urlpatterns = patterns('',
 
     # Options
     (r'^options/$', views.OptionsView.as_view(), {}, 'options'),
+    (r'^options/metrics/$', views.MetricsView.as_view(), {}, 'metrics'),
+    (r'^options/import/$', views.ImportView.as_view(), {}, 'import'),
 
     # Ajax
     (r'^ajax/$', views.AjaxView.as_view(), {}, 'ajax'),
+    (r'^stream/$', views.StreamView.as_view(), {}, 'stream'),
 
     # Other apps
     (r'^avatar/', include('avatar.urls')),
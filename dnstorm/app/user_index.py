@@ -0,0 +1,110 @@
+from django.contrib.auth.models import User
+from django.db.models import Count, signals
+from django.utils.translation import ugettext as _
+
+from avatar.templatetags.avatar_tags import avatar_url
+
+from dnstorm.app.models import UserSearchKey
+from dnstorm.app.templatetags.display_name import get_display_name
+from dnstorm.app.utils import tokenize
+
+# Most keys read for each term of a query, most terms read from a query and
+# least share of the trigrams of a term a key must have to match it.
+CANDIDATES = 200
+MAX_TERMS = 4
+SIMILARITY = 0.5
+
+# User fields indexed
+FIELDS = ['username', 'first_name', 'last_name', 'email']
+
+def trigrams(token):
+    return set(token[i:i + 3] for i in range(len(token) - 2))
+
+def keys(user):
+    """
+    Tokens and trigrams indexed for a user, as ``(key, trigram)`` tuples.
+    """
+    tokens = set(t[:75] for t in tokenize(' '.join(getattr(user, f) or '' for f in FIELDS)))
+    grams = set(g for t in tokens for g in trigrams(t))
+    return [(t, False) for t in sorted(tokens)] + [(g, True) for g in sorted(grams)]
+
+def update(user):
+    """
+    Replaces the keys of the user in the index.
+    """
+    UserSearchKey.objects.filter(user=user).delete()
+    UserSearchKey.objects.bulk_create([UserSearchKey(user_id=user.id, key=k, trigram=t) for k, t in keys(user)])
+
+def rebuild(batch=1000):
+    """
+    Indexes all the users again.
+    """
+    UserSearchKey.objects.all().delete()
+    objs = list()
+    for user in User.objects.order_by('id').iterator():
+        objs.extend(UserSearchKey(user_id=user.id, key=k, trigram=t) for k, t in keys(user))
+        if len(objs) >= batch:
+            UserSearchKey.objects.bulk_create(objs)
+            objs = list()
+    UserSearchKey.objects.bulk_create(objs)
+
+def scores(term, limit, users=None):
+    """
+    Scores of the users matching a term, among the given ``users`` ids if
+    any: 3 for a key equal to the term, 2 for a key starting with it and the
+    share of its trigrams found in the keys of the user otherwise. Trigrams
+    are only looked up when the prefixes don't give ``limit`` users.
+    """
+    s = dict()
+    qs = UserSearchKey.objects.all() if users is None else UserSearchKey.objects.filter(user__in=users)
+    for user, key in qs.filter(trigram=False, key__startswith=term) \
+        .order_by('key').values_list('user', 'key')[:CANDIDATES]:
+        s[user] = max(s.get(user, 0), 3 if key == term else 2)
+    grams = trigrams(term)
+    if len(s) < limit and grams:
+        rows = qs.filter(trigram=True, key__in=grams).values('user') \
+            .annotate(n=Count('id')).order_by('-n')[:CANDIDATES]
+        for row in rows:
+            if row['n'] >= len(grams) * SIMILARITY:
+                s.setdefault(row['user'], float(row['n']) / len(grams))
+    return s
+
+def search(q, limit=10):
+    """
+    Users matching all the terms of the query ranked by the sum of the scores
+    of each term, then by username. The terms after the first one are only
+    looked up among the users matching the previous ones.
+    """
+    ranked = None
+    for term in tokenize(q)[:MAX_TERMS]:
+        s = scores(term, limit, None if ranked is None else ranked.keys())
+        ranked = s if ranked is None else dict((u, ranked[u] + v) for u, v in s.items())
+        if not ranked:
+            break
+    if not ranked:
+        return []
+    users = User.objects.in_bulk(sorted(ranked, key=lambda u: -ranked[u])[:limit * 2])
+    return sorted(users.values(), key=lambda u: (-ranked[u.id], u.username))[:limit]
+
+def serialize(user, email=None):
+    """
+    Compact version of ``item_user.html`` for the collaborators autocomplete,
+    where ``email`` is given for invitations to non-registered users.
+    """
+    data = {
+        'username': user.username,
+        'name': get_display_name(user) if user.is_active else user.last_name,
+        'status': 'staff' if user.is_staff else 'pending' if user.is_active else 'inactive'}
+    if email:
+        data.update({'email': email, 'label': _('Send invitation')})
+    elif data['status'] == 'pending':
+        data['label'] = _('Pending invitation')
+    if user.is_staff:
+        data['avatar'] = avatar_url(user, 32)
+    return data
+
+def index_user(sender, instance, update_fields=None, **kwargs):
+    if not update_fields or set(update_fields) & set(FIELDS):
+        update(instance)
+
+signals.post_save.connect(index_user, sender=User, dispatch_uid='dnstorm_user_index')
@@ -15,6 +15,13 @@ def get_option(name):
     from dnstorm.app.models import Option
     return Option().get(name)
 
+def get_options(*names):
+    """
+    Wrapper for ``get_many`` method of Option class.
+    """
+    from dnstorm.app.models import Option
+    return Option().get_many(*names)
+
 def update_option(name, value):
     """
     Wrapper for ``update`` method of Option class. A tribute to WordPress.
@@ -27,48 +34,131 @@ def get_user(username):
     Return user information.
     """
     from django.contrib.auth.models import User
-    from dnstorm.app.models import Problem, Idea, Comment
 
     user = get_object_or_none(User, username=username, is_active=True)
     if not user:
         return None
-    user.problem_count = Problem.objects.filter(author=user).count()
-    user.idea_count = Idea.objects.filter(author=user).count()
-    user.comment_count = Comment.objects.filter(author=user).count()
+    stats = user_stats(user)
+    user.problem_count = stats.problem_count
+    user.idea_count = stats.idea_count
+    user.comment_count = stats.comment_count
     return user
 
+def load_user_stats(users):
+    """
+    Loads the ``UserStats`` of a list of users in a single query, to be
+    returned by ``user_stats`` without querying again. Users already loaded
+    are skipped.
+    """
+    from dnstorm.app.models import UserStats
+    users = [u for u in users if u and u.pk and getattr(u, '_stats', None) is None]
+    if not users:
+        return
+    stats = dict((s.user_id, s) for s in UserStats.objects.filter(user__in=set(u.pk for u in users)))
+    for u in users:
+        u._stats = stats.get(u.pk, None) or UserStats(user_id=u.pk)
+
+def user_stats(user):
+    """
+    Contribution stats of a user, zeroed for users without any.
+    """
+    load_user_stats([user])
+    return user._stats
+
+def load_tooltips(criteria):
+    """
+    Tooltips of a list of criteria fetched from the cache at once, rendering
+    and caching the missing ones. Copies made from the criteria afterwards
+    keep their tooltips.
+    """
+    from django.core.cache import cache
+    from dnstorm import settings
+    criteria = [c for c in criteria if '_tooltip' not in c.__dict__]
+    if not criteria:
+        return
+    tooltips = cache.get_many(set(c.tooltip_key() for c in criteria))
+    missing = dict()
+    for c in criteria:
+        key = c.tooltip_key()
+        if key not in tooltips:
+            tooltips[key] = missing[key] = c.render_tooltip()
+        c._tooltip = tooltips[key]
+    if missing:
+        cache.set_many(missing, settings.DNSTORM.get('tooltip_cache_timeout', 60 * 60 * 24))
+
+def activity_counter(user):
+    """
+    Returns the activity stream counter for a user.
+    """
+    from dnstorm.app.models import ActivityCounter
+    return (ActivityCounter.objects.filter(user=user).values_list('count', flat=True)[:1] or [0])[0]
+
+def load_actions(actions):
+    """
+    Loads the actors, targets and objects of a list of actions, and the
+    problems of the targets and objects, in a few queries for all of them.
+    Returns the actions as a list.
+    """
+    from django.db.models.query import prefetch_related_objects
+    actions = list(actions)
+    prefetch_related_objects(actions, ['actor', 'target', 'action_object'])
+    objs = [o for a in actions for o in [a.target, a.action_object]
+        if o is not None and 'problem_id' in o.__dict__]
+    prefetch_related_objects(objs, ['problem'])
+    return actions
+
 def activity_reset_counter(user):
     """
     Resets the activity stream counter for a user.
     """
-    return update_option('user_%d_activity_counter' % user.id, 0)
+    from dnstorm.app.models import ActivityCounter
+    ActivityCounter.objects.filter(user=user).update(count=0)
+    return True
 
 def activity_count(obj):
     """
     Increments the activity stream counter of the followers of the given object
-    to make a Facebook look and feel on the top bar.
+    to make a Facebook look and feel on the top bar. All the counters are
+    incremented in a single update.
     """
-    from actstream.models import followers
+    from django.contrib.contenttypes.models import ContentType
+    from django.db.models import F
+    from actstream.models import Follow
+    from dnstorm.app.models import ActivityCounter
 
     if not obj:
         return 0
-    for user in followers(obj):
-        name = 'user_%d_activity_counter' % user.id
-        count = get_option(name)
-        try:
-            count = int(count)
-        except:
-            count = 0
-        update_option(name, count+1)
+    follows = Follow.objects.filter(
+        content_type=ContentType.objects.get_for_model(obj), object_id=obj.pk)
+    ActivityCounter.objects.bulk_create([ActivityCounter(user_id=user) for user in
+        follows.filter(user__activity_counter__isnull=True).values_list('user', flat=True)])
+    return ActivityCounter.objects.filter(user__in=follows.values('user')).update(count=F('count') + 1)
 
 def activity_register(_user, _action_object):
+    """
+    Enqueues the registration of an activity when an object is saved. The
+    activity is processed by ``activity_process`` in a background job, so
+    the request doesn't wait for the diff and the notifications.
+    """
+    from django.forms import ValidationError
+    from django.utils.translation import ugettext as _
+    from dnstorm.app import jobs
+
+    klass = _action_object.__class__.__name__.lower()
+    if klass not in ['problem', 'criteria', 'idea', 'alternative', 'comment']:
+        raise ValidationError(_('Wrong object type'))
+
+    data = {'user': _user.id, 'klass': klass, 'pk': _action_object.pk}
+    if hasattr(_action_object, 'edit_message'):
+        data['edit_message'] = _action_object.edit_message
+    jobs.enqueue('activity_register', key='%s:%d:%d' % (klass, _action_object.pk, _user.id), **data)
+
+def activity_process(_user, _action_object):
     """
     Registers and activity when an object is saved. Takes a diff with a
     previous version of edited objects, put it as message content in a
     timeline, uses the verbs 'created' or 'edited' for actions on actstream.
     """
-    from lxml.html.diff import htmldiff
-
     from django.db.models.loading import get_model
     from django.forms import ValidationError
     from django.forms.models import model_to_dict
@@ -77,17 +167,23 @@ def activity_register(_user, _action_object):
     from actstream import action
     from actstream.actions import follow, is_following
     from actstream.models import action_object_stream
+    from dnstorm.app import stream
+    from dnstorm.app.diff import html_diff
 
     klass = _action_object.__class__.__name__.lower()
     if klass not in ['problem', 'criteria', 'idea', 'alternative', 'comment']:
         raise forms.ValidationError(_('Wrong object type'))
 
+    # Don't do anything if the problem or the action object is a draft
+    if hasattr(_action_object, 'published') and not getattr(_action_object, 'published'):
+        return None
+
     # Last activity
     last = (action_object_stream(_action_object)[:1] or [None])[0]
-    _content_old = render_to_string('diffbase_' + klass + '.html', {klass: last}) if last else ''
+    _content_old = (last.data or dict()).get('content', '') if last else ''
     _content = render_to_string('diffbase_' + klass + '.html', {klass: _action_object})
     _emsg = _action_object.edit_message if hasattr(_action_object, 'edit_message') else ''
-    _diff = htmldiff(_content_old, _content)
+    _diff, _diff_stats = html_diff(_content_old, _content, klass)
 
     # Set target problem
     if klass in ['comment']:
@@ -104,10 +200,6 @@ def activity_register(_user, _action_object):
     elif klass in ['problem']:
         _target = _action_object
 
-    # Don't do anything if the problem or the action object is a draft
-    if hasattr(_action_object, 'published') and not getattr(_action_object, 'published'):
-        return None
-
     # Set verb
     _verb = 'edited'
     if klass == 'comment':
@@ -124,14 +216,26 @@ def activity_register(_user, _action_object):
     # Action
     a = action.send(_user, verb=_verb, action_object=_action_object, target=_target)
     a[0][1].data = { 'diff': _diff, 'content': _content,
-        'edit_message': _emsg, 'object': model_to_dict(_action_object)}
+        'edit_message': _emsg, 'object': model_to_dict(_action_object),
+        'diff_stats': _diff_stats }
     a[0][1].save()
     activity_count(_target)
+    stream.publish(_target, 'activity', _user, verb=_verb, klass=klass)
     follow(_user, _follow, actor_only=False) if not is_following(_user, _follow) else None
     # TODO send e-mail
     #if _notification:
         #notification.send([_follow], 'problem', email_context({ 'action': a }))
 
+def tokenize(text):
+    """
+    Lowercase ASCII words of a text, without accents and punctuation, as
+    indexed by ``dnstorm.app.user_index`` and ``dnstorm.app.search``.
+    """
+    import re
+    import unicodedata
+    text = unicodedata.normalize('NFKD', unicode(text or '')).encode('ascii', 'ignore').lower()
+    return [t for t in re.split(r'[^a-z0-9]+', text) if t]
+
 email_regex = '[^@]+@[^@]+\.[^@]+'
 
 def is_email(_string):
@@ -151,6 +255,4 @@ def email_context(more_context=dict()):
 
     return dict(dict({
         'dnstorm_url': DNSTORM_URL,
-        'site_title': get_option('site_title'),
-        'site_url': get_option('site_url')
-    }).items() + more_context.items())
+    }).items() + get_options('site_title', 'site_url').items() + more_context.items())
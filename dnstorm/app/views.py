@@ -6,6 +6,7 @@ import string
 import time
 import urlparse
 
+from collections import OrderedDict
 from datetime import datetime
 from lxml.html.diff import htmldiff
 
@@ -17,19 +18,20 @@ from django.contrib.auth.models import User
 from django.contrib.auth.views import login as login_view
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
-from django.core.paginator import Paginator
+from django.core.exceptions import NON_FIELD_ERRORS, ObjectDoesNotExist, PermissionDenied
 from django.core.urlresolvers import reverse, resolve
+from django.db import transaction
 from django.db.models import Q, Sum
 from django.db.models.query import EmptyQuerySet
 from django.forms.util import ErrorList
-from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponseForbidden, HttpResponseServerError, QueryDict
+from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponseForbidden, HttpResponseServerError, QueryDict, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
-from django.template import loader, Context
+from django.template import loader
 from django.template.defaultfilters import slugify
 from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
 from django.utils.html import strip_tags
+from django.utils.http import parse_etags, parse_http_date_safe
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext as _
 from django.views.decorators.csrf import csrf_protect
@@ -48,7 +50,8 @@ from registration import signals as registration_signals
 from registration.backends.default.views import RegistrationView as BaseRegistrationView
 
 from dnstorm import settings
-from dnstorm.app import models, forms, perms, utils
+from dnstorm.app import api, models, counters, export, forms, fragments, importer, loaders, metrics, perms, results, search, stream, user_index, utils
+from dnstorm.app.pagination import CursorPaginator, ListPaginator
 from dnstorm.app.templatetags.user_tags import user_problem_count, user_idea_count, user_comment_count
 
 #
@@ -70,6 +73,15 @@ class DeleteMixin(object):
             raise PermissionDenied
         return obj
 
+    def delete(self, *args, **kwargs):
+        users = counters.contributors(self.get_object())
+        with transaction.commit_on_success():
+            response = super(DeleteMixin, self).delete(*args, **kwargs)
+            if isinstance(self.object, (models.Criteria, models.Idea, models.Alternative)):
+                counters.update(self.object.problem)
+            counters.reconcile(models.UserStats, users)
+        return response
+
     def get_success_url(self):
         messages.success(self.request, _('The %s was deleted successfully' % self.object._meta.verbose_name))
         obj = self.object.problem if hasattr(self.object, 'problem') else self.object
@@ -255,31 +267,31 @@ class AjaxView(View):
 
     def user_search(self):
         """
-        Will display an invitation button instead of the user result if what's
-        being searched is an e-mail.
+        Search users to add as collaborators in the user index, or by their
+        exact e-mail for e-mail queries. Up to five queries can be given at
+        once, and the users found for each one are returned in a compact
+        format rendered by the client, or an invitation for e-mails of
+        non-registered users.
         """
         # Validation
         user = get_user(self.request)
         if not user.is_authenticated():
             raise PermissionDenied
-        q = self.request.GET.get('user_search', None)
-        if not q:
+        queries = [q for q in self.request.GET.getlist('user_search') if q][-5:]
+        if not queries:
             raise Http404
 
         # Response
-        result = ''
-        if utils.is_email(q):
-            if User.objects.filter(email=q).exists():
-                result = loader.render_to_string('item_user.html', {'user': User.objects.filter(email=q)[0], 'enclosed': True})
+        result = dict()
+        for q in queries:
+            if utils.is_email(q):
+                users = User.objects.filter(email__iexact=q)[:1]
+                result[q] = [user_index.serialize(u) for u in users] or \
+                    [user_index.serialize(User(username=q, email=q), email=q)]
             else:
-                u = User(username=q, email=q)
-                result = loader.render_to_string('item_user.html', {'user': u, 'email_invitation': q, 'enclosed': True})
-            return HttpResponse(json.dumps({'result': result}), content_type='application/json')
-
-        for u in User.objects.filter(Q(username__icontains=q) | Q(email__icontains=q))[:10]:
-            result += loader.render_to_string('item_user.html', {'user': u, 'enclosed': True})
+                result[q] = [user_index.serialize(u) for u in user_index.search(q)]
 
-        return HttpResponse(json.dumps({'result': result}), content_type='application/json')
+        return HttpResponse(json.dumps({'result': result}, separators=(',', ':')), content_type='application/json')
 
     def collaborator_add(self):
         """
@@ -300,7 +312,7 @@ class AjaxView(View):
         follow(user, problem, actor_only=False) if not is_following(user, problem) else None
 
         # Response
-        result = ''.join([loader.render_to_string('item_user_collaborator.html', {'users': problem.collaborator.order_by('first_name')})])
+        result = ''.join([fragments.render('item_user_collaborator.html', {'users': problem.collaborator.order_by('first_name')})])
         return HttpResponse(json.dumps({'result': result}), content_type='application/json')
 
     def collaborator_delete(self):
@@ -322,7 +334,7 @@ class AjaxView(View):
             models.Invitation.objects.filter(user=user).delete()
 
         # Response
-        result = ''.join([loader.render_to_string('item_user_collaborator.html', {'users': problem.collaborator.order_by('first_name')})])
+        result = ''.join([fragments.render('item_user_collaborator.html', {'users': problem.collaborator.order_by('first_name')})])
         return HttpResponse(json.dumps({'result': result}), content_type='application/json')
 
     def invitation_add(self):
@@ -356,7 +368,7 @@ class AjaxView(View):
         notification.send([user], 'invitation', utils.email_context({ 'invitation': invitation }))
 
         # Response
-        result = ''.join([loader.render_to_string('item_user_collaborator.html', {'users': problem.collaborator.order_by('first_name')})])
+        result = ''.join([fragments.render('item_user_collaborator.html', {'users': problem.collaborator.order_by('first_name')})])
         return HttpResponse(json.dumps({'result': result}), content_type='application/json')
 
     def activity_reset_counter(self):
@@ -395,7 +407,11 @@ class AjaxView(View):
         # save
         if not criteria.is_valid():
             return HttpResponse(json.dumps({'errors':dict(criteria.errors)}), content_type='application/json')
-        criteria.save()
+        with transaction.commit_on_success():
+            criteria.save()
+            if not obj:
+                counters.increment(problem, criteria_count=1)
+        results.update_results(problem, criteria=[criteria.instance.id])
         # reload with updated data
         criteria = CriteriaForm(instance=criteria.instance)
         criteria.instance.get_data()
@@ -405,7 +421,7 @@ class AjaxView(View):
 
         # Response
         utils.activity_register(user, criteria.instance)
-        result = loader.render_to_string('item_criteria.html', {'criteria': criteria.instance, 'show_actions': True, 'criteria_form': criteria})
+        result = fragments.render('item_criteria.html', {'criteria': criteria.instance, 'show_actions': True, 'criteria_form': criteria})
         return HttpResponse(json.dumps({'result': result}), content_type='application/json')
 
     def comment_new(self):
@@ -456,13 +472,20 @@ class AjaxView(View):
         # collaborator
         _problem.collaborator.add(user)
         follow(user, _problem, actor_only=False) if not is_following(user, _problem) else None
-        comment.save()
+        with transaction.commit_on_success():
+            comment.save()
+            counters.increment(_problem, comment_count=1)
+            counters.increment_user(user, comment_count=1)
+            if comment.idea:
+                counters.increment(comment.idea, comment_count=1)
+            if comment.alternative:
+                counters.increment(comment.alternative, comment_count=1)
 
         # Response
         utils.activity_register(user, comment)
-        t = loader.get_template('item_comment.html')
-        c = Context({'comment': comment})
-        return HttpResponse(json.dumps({'target': target, 'html': re.sub("\n", '', t.render(c))}), content_type='application/json')
+        html = fragments.render('item_comment.html', {'comment': comment})
+        stream.publish(_problem, 'comment', user, target=target, html=html)
+        return HttpResponse(json.dumps({'target': target, 'html': html}), content_type='application/json')
 
     def vote_alternative(self):
         """
@@ -475,17 +498,20 @@ class AjaxView(View):
             raise Http404
 
         # Commit
-        vote = models.Vote.objects.filter(alternative=a, author=user)
-        if len(vote) > 0:
-            vote.delete()
-            voted = False
-        else:
-            models.Vote(alternative=a, author=user).save()
-            voted = True
+        with transaction.commit_on_success():
+            vote = models.Vote.objects.filter(alternative=a, author=user)
+            if len(vote) > 0:
+                values = sum(v.value or 0 for v in vote)
+                counters.increment(a, vote_count=-len(vote), vote_sum=-values)
+                vote.delete()
+                voted = False
+            else:
+                models.Vote(alternative=a, author=user).save()
+                counters.increment(a, vote_count=1)
+                voted = True
 
         # Response
-        votes = models.Vote.objects.filter(alternative=a).count()
-        response = {'votes': votes, 'voted': voted}
+        response = {'votes': a.vote_count, 'voted': voted}
         return HttpResponse(json.dumps(response), content_type='application/json')
 
     def idea_like(self):
@@ -499,15 +525,19 @@ class AjaxView(View):
             return HttpResponseForbidden()
 
         # Commit
-        if models.Vote.objects.filter(idea=idea, author=user).exists():
-            models.Vote.objects.filter(idea=idea, author=user).delete()
-            voted = False
-        else:
-            models.Vote.objects.create(idea=idea, author=user)
-            voted = True
+        with transaction.commit_on_success():
+            votes = models.Vote.objects.filter(idea=idea, author=user)
+            if votes.exists():
+                counters.increment(idea, vote_count=-votes.count())
+                votes.delete()
+                voted = False
+            else:
+                models.Vote.objects.create(idea=idea, author=user)
+                counters.increment(idea, vote_count=1)
+                voted = True
 
         # Response
-        response = {'counter': idea.vote_count(), 'voted': voted}
+        response = {'counter': idea.vote_count, 'voted': voted}
         return HttpResponse(json.dumps(response), content_type='application/json')
 
     def alternative_like(self):
@@ -522,9 +552,13 @@ class AjaxView(View):
             return HttpResponseForbidden()
 
         # Commit
-        obj, created = models.Vote.objects.get_or_create(alternative=alternative, author=user)
-        obj.value = value
-        obj.save()
+        with transaction.commit_on_success():
+            obj, created = models.Vote.objects.get_or_create(alternative=alternative, author=user)
+            previous = obj.value or 0
+            obj.value = value
+            obj.save()
+            counters.increment(alternative, vote_count=1 if created else 0,
+                vote_sum=int(obj.value or 0) - previous)
 
         # Response
         response = {'counter': value}
@@ -561,23 +595,36 @@ class HomeView(TemplateView):
                     Q(published=True)
                 ) & (
                     (Q(public=True) & Q(open=True)) |
-                    Q(collaborator__in=[self.request.user]) |
+                    Q(id__in=self.get_collaborating()) |
                     Q(author=self.request.user)
                 )
             else:
                 q_problems = (Q(published=True) & Q(public=True))
+        elif not authenticated:
+            raise PermissionDenied
         elif self.request.resolver_match.url_name == 'problems_collaborating':
-            q_problems = (Q(published=True) & Q(collaborator__in=[self.request.user]) & ~Q(author=self.request.user))
+            q_problems = (Q(published=True) & Q(id__in=self.get_collaborating()) & ~Q(author=self.request.user))
         elif self.request.resolver_match.url_name == 'problems_drafts':
             q_problems = (Q(published=False) & Q(author=self.request.user))
 
         if authenticated:
             context['tabs'] = self.get_tabs()
-        problems = Paginator(models.Problem.objects.filter(q_problems).distinct().order_by('-last_activity'), 25)
-        context['problems'] = problems.page(self.request.GET.get('page', 1))
+        problems = CursorPaginator(models.Problem.objects.filter(q_problems).select_related('author').prefetch_related('coauthor'), 25, '-last_activity')
+        context['problems'] = problems.page(self.request.GET.get('cursor'))
+        perms.problem_list(self.request.user, context['problems'].object_list)
+        utils.load_user_stats([p.author for p in context['problems']] +
+            [u for p in context['problems'] for u in p.coauthor.all()])
         context['info'] = self.get_info()
         return context
 
+    def get_collaborating(self):
+        """
+        Subquery of the problems the user collaborates with, to be used in a
+        semi-join instead of joining the collaborators table.
+        """
+        return models.Problem.collaborator.through.objects \
+            .filter(user=self.request.user).values('problem')
+
     def get_info(self):
         return {
             'icon': 'info',
@@ -608,6 +655,151 @@ class HomeView(TemplateView):
             }]
         }
 #
+# }}} Search {{{
+#
+
+class SearchView(TemplateView):
+    """
+    Search for problems, criteria, ideas and comments the user can view.
+    """
+    template_name = '_search.html'
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(SearchView, self).get_context_data(**kwargs)
+        self.request.user = get_user(self.request)
+        query = self.request.GET.get('q', '').strip()
+        paginator = ListPaginator(search.search(self.request.user, query) if query else [], 25)
+        context['query'] = query
+        context['results'] = paginator.page(self.request.GET.get('cursor'))
+        context['results'].object_list = search.load(context['results'].object_list)
+        context['results_count'] = paginator.count
+        context['site_title'] = '%s | %s' % (_('Search'), utils.get_option('site_title'))
+        context['info'] = self.get_info()
+        return context
+
+    def get_info(self):
+        return {
+            'icon': 'magnifying-glass',
+            'icon_url': reverse('search'),
+            'title': _('Search'),
+            'show': True
+        }
+#
+# }}} Export {{{
+#
+
+class ExportView(View):
+    """
+    Strategy tables of the problems the user can view, or just of the given
+    ``problem`` ids, streamed in the ``format`` parameter: CSV, NDJSON or
+    XLSX, which is buffered in a temporary file before being sent.
+    """
+
+    def get(self, *args, **kwargs):
+        user = get_user(self.request)
+        fmt = self.request.GET.get('format', 'csv')
+        if fmt not in export.FORMATS:
+            raise Http404
+        problems = models.Problem.objects.filter(perms.problem_filter(user))
+        ids = [i for i in self.request.GET.getlist('problem') if i.isdigit()]
+        if ids:
+            problems = problems.filter(id__in=ids)
+        function, content_type, extension = export.FORMATS[fmt]
+        response = StreamingHttpResponse(export.export(problems, fmt), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="strategy-tables.%s"' % extension
+        return response
+
+#
+# }}} API {{{
+#
+
+class ApiView(View):
+    """
+    Read-only JSON API for the problems the user can view and their
+    collections. Responses carry an ETag and a Last-Modified date computed
+    from the loaded objects, and conditional requests get a ``304`` before
+    the objects are serialized.
+    """
+
+    def get(self, *args, **kwargs):
+        user = get_user(self.request)
+        params = self.request.GET
+        page = None
+        try:
+            if 'pk' in kwargs:
+                problem = get_object_or_404(models.Problem, id=kwargs['pk'])
+                if not perms.problem(user, 'view', problem):
+                    return self.error(403, 'You are not allowed to view this problem.')
+                if 'collection' in kwargs:
+                    render, page, objects = api.collection(user, params, problem, kwargs['collection'])
+                else:
+                    render, objects = api.problem(user, params, problem)
+            else:
+                render, page, objects = api.problems(user, params)
+        except api.ApiError as e:
+            return self.error(400, unicode(e))
+
+        etag, modified = api.validators(self.request.get_full_path(), objects)
+        if self.not_modified(etag, modified):
+            response = HttpResponse(status=304)
+        else:
+            content = OrderedDict([('version', api.VERSION), ('data', render())])
+            if page is not None:
+                content['next'] = self.cursor_url(page.next_cursor)
+                content['previous'] = self.cursor_url(page.previous_cursor)
+            response = HttpResponse(json.dumps(content, default=float), content_type='application/json')
+        response['ETag'] = etag
+        if modified:
+            response['Last-Modified'] = modified
+        return response
+
+    def not_modified(self, etag, modified):
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return '*' in parse_etags(if_none_match) or etag[3:-1] in parse_etags(if_none_match)
+        since = parse_http_date_safe(self.request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return bool(since and modified and parse_http_date_safe(modified) <= since)
+
+    def cursor_url(self, cursor):
+        if not cursor:
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return self.request.build_absolute_uri('%s?%s' % (self.request.path, params.urlencode()))
+
+    def error(self, status, message):
+        return HttpResponse(json.dumps({'version': api.VERSION, 'error': message}),
+            status=status, content_type='application/json')
+
+#
+# }}} Stream {{{
+#
+
+class StreamView(View):
+    """
+    Server-sent events of the problems followed by the user, and of the one
+    being viewed given in the ``problem`` parameter. Connections are long
+    lived, so this view is served by the asynchronous workers of the
+    ``stream`` process in the ``Procfile``.
+    """
+
+    def get(self, *args, **kwargs):
+        user = get_user(self.request)
+        followed = stream.followed(user)
+        viewed = set()
+        problem = self.request.GET.get('problem', '')
+        problem = utils.get_object_or_none(models.Problem, id=problem) if problem.isdigit() else None
+        if problem and perms.problem(user, 'view', problem):
+            viewed.add(problem.id)
+        if not followed and not viewed:
+            return HttpResponse(status=204)
+        since = self.request.META.get('HTTP_LAST_EVENT_ID', '')
+        response = StreamingHttpResponse(stream.stream(user, followed, viewed,
+            int(since) if since.isdigit() else None), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+#
 # }}} Options {{{
 #
 
@@ -651,6 +843,46 @@ class OptionsView(SuperUserRequiredMixin, FormView):
 
         messages.success(self.request, mark_safe(_('Options saved.')))
         return HttpResponseRedirect(reverse('options'))
+
+class MetricsView(SuperUserRequiredMixin, View):
+    """
+    Request metrics of all the processes by URL name, for superusers.
+    """
+
+    def get(self, *args, **kwargs):
+        return HttpResponse(json.dumps({'metrics': metrics.report(metrics.collect())}), content_type='application/json')
+
+class ImportView(SuperUserRequiredMixin, FormView):
+    """
+    Bulk import of problems, criteria and ideas from a file for superusers.
+    """
+    template_name = '_update_options.html'
+    form_class = forms.ImportForm
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(ImportView, self).get_context_data(**kwargs)
+        context['site_title'] = '%s | %s' % (_('Import'), utils.get_option('site_title'))
+        context['info'] = self.get_info()
+        context['title'] = _('Import')
+        return context
+
+    def get_info(self):
+        return {
+            'icon': 'upload',
+            'icon_url': reverse('import'),
+            'title': _('Import'),
+            'show': True
+        }
+
+    def form_valid(self, form):
+        try:
+            objects = importer.validate(importer.parse(form.cleaned_data['file'], form.cleaned_data['format']), self.request.user)
+        except importer.InvalidImport as e:
+            form._errors[NON_FIELD_ERRORS] = ErrorList(e.errors)
+            return self.form_invalid(form)
+        counts = importer.save(objects, self.request.user)
+        messages.success(self.request, mark_safe(_('Imported %d problems, %d criteria and %d ideas.') % counts))
+        return HttpResponseRedirect(reverse('import'))
 #
 # }}} Comments {{{
 #
@@ -663,7 +895,11 @@ class CommentView(RedirectView):
 
     def get_redirect_url(self, *args, **kwargs):
         comment = get_object_or_404(models.Comment, id=kwargs['pk'])
-        return comment.get_absolute_url()
+        target = comment.criteria or comment.idea or comment.alternative
+        problem = comment.problem or getattr(target, 'problem', None)
+        if not problem:
+            raise Http404
+        return '%s#comment-%d' % (problem.get_absolute_url(), comment.id)
 
 #
 # }}} Users {{{
@@ -701,8 +937,10 @@ class UserView(LoginRequiredMixin, TemplateView):
         context['site_title'] = '%s | %s' % (self.object.username, _('User profile'))
         context['profile'] = self.object
         context['info'] = self.get_info()
-        activities = Paginator(actor_stream(context['profile']), 25)
-        context['activities'] = activities.page(self.request.GET.get('page', 1))
+        activities = CursorPaginator(actor_stream(context['profile']).select_related(
+            'actor_content_type', 'target_content_type', 'action_object_content_type'), 25, '-timestamp')
+        context['activities'] = activities.page(self.request.GET.get('cursor'))
+        context['activities'].object_list = utils.load_actions(context['activities'].object_list)
         return context
 
     def get_info(self):
@@ -727,13 +965,13 @@ class UsersView(LoginRequiredMixin, TemplateView):
             users = User.objects.filter(is_active=False, is_staff=False).order_by('first_name')
         else:
             users = User.objects.filter(is_active=True, is_staff=True).order_by('first_name')
-        page = self.request.GET['page'] if 'page' in self.request.GET else 1
         context['show_user_actions'] = True if self.request.user.is_superuser else False
         context['user_type'] = self.user_type
         context['site_title'] = '%s | %s' % (_('Users'), utils.get_option('site_title'))
         context['info'] = self.get_info()
         context['tabs'] = self.get_tabs()
-        context['users'] = Paginator(users, 25).page(page)
+        context['users'] = CursorPaginator(users, 25, 'first_name').page(self.request.GET.get('cursor'))
+        utils.load_user_stats(context['users'])
         return context
 
     def get_info(self):
@@ -825,6 +1063,12 @@ class UserPasswordUpdateView(FormView):
     form_class = forms.UserPasswordForm
     template_name = '_update_user_password.html'
 
+    def dispatch(self, *args, **kwargs):
+        obj = get_object_or_404(User, username=kwargs['username'])
+        if not self.request.user.is_superuser and self.request.user != obj:
+            raise PermissionDenied
+        return super(UserPasswordUpdateView, self).dispatch(*args, **kwargs)
+
     def get_object(self, *args, **kwargs):
         return get_object_or_404(User, username=self.kwargs.get('username', None))
 
@@ -947,9 +1191,9 @@ def activity_buttons(request):
     },{
         'icon': 'torso',
         'title': _('User activity'),
-        'url': reverse('user', kwargs={'username': request.user.username}),
+        'url': reverse('user', kwargs={'username': request.user.username}) if request.user.is_authenticated() else '',
         'marked': request.resolver_match.url_name == 'user',
-        'show': True
+        'show': request.user.is_authenticated()
     }]
 
 class ActivityView(LoginRequiredMixin, TemplateView):
@@ -997,23 +1241,26 @@ class ActivityView(LoginRequiredMixin, TemplateView):
             activities = Action.objects.public(action_object_content_type=_content_type, target_object_id=self.problem.id)
             context['tabs'] = self.get_problem_tabs()
             context['problem'] = self.problem
-        context['activities'] = Paginator(activities, 25).page(self.request.GET.get('page', 1))
-        context['activity_count'] = activities.count()
+        activities = CursorPaginator(activities.select_related(
+            'actor_content_type', 'target_content_type', 'action_object_content_type'), 25, '-timestamp')
+        context['activities'] = activities.page(self.request.GET.get('cursor'))
+        context['activities'].object_list = utils.load_actions(context['activities'].object_list)
+        context['activity_count'] = activities.count_display
 
         context['info'] = self.get_info()
         context['site_title'] = '%s | %s' % (_('Activity'), utils.get_option('site_title'))
         for a in context['activities']:
             a.action_object.get_data() if callable(getattr(self, 'get_data', None)) else None
         if hasattr(self, 'problem'):
-            context['criteria_count'] = models.Criteria.objects.filter(problem=self.problem).count()
-            context['idea_count'] = models.Idea.objects.filter(problem=self.problem, published=True).count()
-            context['alternative_count'] = models.Alternative.objects.filter(problem=self.problem).count()
-            context['comment_count'] = models.Comment.objects.filter(Q(problem=self.problem) | Q(criteria__problem=self.problem) | \
-                Q(idea__problem=self.problem) | Q(alternative__problem=self.problem)).count()
+            context['criteria_count'] = self.problem.criteria_count
+            context['idea_count'] = self.problem.idea_count
+            context['alternative_count'] = self.problem.alternative_count
+            context['comment_count'] = self.problem.comment_count
         else:
+            totals = models.Problem.objects.aggregate(ideas=Sum('idea_count'), comments=Sum('comment_count'))
             context['problem_count'] = models.Problem.objects.filter(published=True).count()
-            context['idea_count'] = models.Idea.objects.filter(published=True).count()
-            context['comment_count'] = models.Comment.objects.all().count()
+            context['idea_count'] = totals['ideas'] or 0
+            context['comment_count'] = totals['comments'] or 0
         return context
 
     def get_info(self):
@@ -1250,6 +1497,7 @@ class ProblemUpdateView(ProblemMixin, UpdateView):
         ``request.POST``.
         """
         self.request.user = get_user(self.request)
+        published = form.initial.get('published', False)
         self.object = form.save(commit=False)
 
         # Problem save
@@ -1260,7 +1508,9 @@ class ProblemUpdateView(ProblemMixin, UpdateView):
             styles=settings.SANITIZER_ALLOWED_STYLES,
             strip=True, strip_comments=True)
         self.object.published = True if self.request.POST.get('publish', None) else False
-        self.object.save()
+        with transaction.commit_on_success():
+            self.object.save()
+            counters.increment_user(self.object.author_id, problem_count=int(self.object.published) - int(published))
         # Coauthors
         if self.object.author.id != self.request.user.id:
             self.object.coauthor.add(self.request.user)
@@ -1350,41 +1600,22 @@ class ProblemView(ProblemMixin, DetailView):
         context['title'] = self.object.title
 
         # Comments
-        context['comments'] = models.Comment.objects.filter(problem=self.object)
         context['comment_form'] = forms.CommentForm()
 
         # Collaborators
         if self.request.resolver_match.url_name == 'problem_collaborators':
+            context['comments'] = models.Comment.objects.filter(problem=self.object)
             context['collaborators'] = self.object.collaborators.filter(is_staff=True).order_by('first_name')
             return context
 
-        # Criterias
-        context['criteria'] = list()
-        for c in models.Criteria.objects.filter(problem=self.object):
-            c.problem_count = models.Problem.objects.filter(criteria=c).count()
-            c.get_data(self.request.user)
-            context['criteria'].append(c)
-        context['criteria'] = sorted(context['criteria'], key=lambda x: (x.name))
-
-        # Ideas drafts
+        # Criteria, ideas and alternatives
+        data = loaders.ProblemLoader(self.object, self.request.user)
+        context['comments'] = data.comments
+        context['criteria'] = data.criteria
         if self.request.user.is_authenticated():
-            context['ideas_drafts'] = models.Idea.objects.filter(problem=self.object.id, author=self.request.user, published=False)
-            for idea in context['ideas_drafts']:
-                idea.get_data(self.request.user)
-            context['ideas_drafts'] = sorted(context['ideas_drafts'], key=lambda x: (x.votes, x.updated, x.created), reverse=True)
-
-        # Ideas
-        context['ideas'] = models.Idea.objects.filter(problem=self.object.id, published=True)
-        for idea in context['ideas']:
-            idea.get_data(self.request.user)
-        context['ideas'] = sorted(context['ideas'], key=lambda x: (x.votes, x.updated, x.created), reverse=True)
-
-        # Alternatives
-        context['alternatives'] = list()
-        for a in models.Alternative.objects.filter(problem=self.object):
-            a.get_data(self.request.user)
-            context['alternatives'].append(a)
-        context['alternatives'] = sorted(context['alternatives'], key=lambda x: (x.vote_value, x.updated, x.created), reverse=True)
+            context['ideas_drafts'] = data.ideas_drafts
+        context['ideas'] = data.ideas
+        context['alternatives'] = data.alternatives
 
         # Results
         self.object.get_data(self.request.user)
@@ -1412,9 +1643,12 @@ class CriteriaCreateView(RedirectView):
             raise PermissionDenied
 
         # Commit
-        criteria = models.Criteria.objects.create(
-            problem=problem,
-            author=self.request.user)
+        with transaction.commit_on_success():
+            criteria = models.Criteria.objects.create(
+                problem=problem,
+                author=self.request.user)
+            counters.increment(problem, criteria_count=1)
+        results.update_results(problem, criteria=[criteria.id])
         return reverse('criteria_update', kwargs={'pk': criteria.id})
 
 class CriteriaDeleteView(DeleteMixin, DeleteView):
@@ -1453,6 +1687,8 @@ class CriteriaUpdateView(ProblemMixin, UpdateView):
 
     def form_valid(self, form):
         form.instance.save()
+        if set(form.changed_data) & set(['fmt', 'order', 'weight', 'result']):
+            results.update_results(self.object.problem, criteria=[self.object.id])
         if self.object.author != self.request.user:
             self.object.coauthor.add(self.request.user)
         messages.success(self.request, mark_safe(_('Criteria saved.')))
@@ -1503,6 +1739,7 @@ class IdeaUpdateView(ProblemMixin, UpdateView):
             raise PermissionDenied
 
         # base data
+        published = self.object.published
         self.object = form.save(commit=False)
 
         # if the idea is published or is a draft
@@ -1514,7 +1751,10 @@ class IdeaUpdateView(ProblemMixin, UpdateView):
             return_url = reverse('idea_update', kwargs={'pk': self.object.id})
         if self.request.user != self.object.author:
             self.object.coauthor.add(self.request.user)
-        self.object.save()
+        with transaction.commit_on_success():
+            self.object.save()
+            counters.increment(self.object.problem, idea_count=int(self.object.published) - int(published))
+            counters.increment_user(self.object.author_id, idea_count=int(self.object.published) - int(published))
 
         # get list of criteria objects
         criteria = dict()
@@ -1566,6 +1806,8 @@ class IdeaUpdateView(ProblemMixin, UpdateView):
         models.IdeaCriteria.objects \
             .exclude(id__in=[ic.id for ic in updated]) \
             .filter(idea=self.object).delete()
+        results.update_results(self.object.problem,
+            alternatives=self.object.alternative_set.values_list('id', flat=True))
 
         # Response
         if self.object.published == True:
@@ -1579,6 +1821,13 @@ class IdeaUpdateView(ProblemMixin, UpdateView):
 class IdeaDeleteView(DeleteMixin, DeleteView):
     model = models.Idea
 
+    def delete(self, *args, **kwargs):
+        idea = self.get_object()
+        alternatives = list(idea.alternative_set.values_list('id', flat=True))
+        response = super(IdeaDeleteView, self).delete(*args, **kwargs)
+        results.update_results(idea.problem, alternatives=alternatives)
+        return response
+
 #
 # }}} Alternative {{{
 #
@@ -1600,9 +1849,12 @@ class AlternativeCreateView(RedirectView):
             raise PermissionDenied
 
         # Commit
-        alternative = models.Alternative.objects.create(
-            problem=problem,
-            author=self.request.user)
+        with transaction.commit_on_success():
+            alternative = models.Alternative.objects.create(
+                problem=problem,
+                author=self.request.user)
+            counters.increment(problem, alternative_count=1)
+        results.update_results(problem, alternatives=[alternative.id])
         return reverse('alternative_update', kwargs={'pk': alternative.id})
 
 class AlternativeUpdateView(ProblemMixin, UpdateView):
@@ -1626,6 +1878,7 @@ class AlternativeUpdateView(ProblemMixin, UpdateView):
         for i in ideas:
             self.object.idea.add(i)
         self.object.save()
+        results.update_results(self.object.problem, alternatives=[self.object.id])
         if self.object.author != self.request.user:
             self.object.coauthor.add(self.request.user)
         # Response
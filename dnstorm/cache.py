@@ -0,0 +1,36 @@
+import base64
+
+try:
+    from django.utils.six.moves import cPickle as pickle
+except ImportError:
+    import pickle
+
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+
+class DatabaseCache(BaseDatabaseCache):
+    """
+    Database cache reading many keys in a single query instead of one query
+    for each key. Expired entries are left to be culled.
+    """
+
+    def get_many(self, keys, version=None):
+        keys = dict((self.make_key(key, version=version), key) for key in keys)
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return dict()
+        db = router.db_for_read(self.cache_model_class)
+        table = connections[db].ops.quote_name(self._table)
+        cursor = connections[db].cursor()
+        cursor.execute('SELECT cache_key, value, expires FROM %s WHERE cache_key IN (%s)' % (
+            table, ', '.join(['%s'] * len(keys))), list(keys))
+        now = timezone.now()
+        values = dict()
+        for key, value, expires in cursor.fetchall():
+            if expires >= now:
+                value = connections[db].ops.process_clob(value)
+                values[keys[key]] = pickle.loads(base64.b64decode(force_bytes(value)))
+        return values
@@ -22,6 +22,7 @@ STATIC_ROOT = 'static'
 STATIC_URL = '/static/'
 
 MIDDLEWARE_CLASSES = (
+    'dnstorm.app.middleware.MetricsMiddleware',
     'django.middleware.gzip.GZipMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -100,6 +101,25 @@ LOGGING = {
     }
 }
 
+# Cache
+# The cache must be shared by all the processes, as it keeps the version
+# stamps used to invalidate the options loaded by each process and the
+# rendered fragments. The database cache, which reads many keys in a single
+# query, works out of the box after
+# ``python manage.py createcachetable dnstorm_cache``; memcached is faster
+# for larger deployments. Never use a per-process backend like locmem when
+# running more than one process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'dnstorm.cache.DatabaseCache',
+        'LOCATION': 'dnstorm_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 # Date formats
 
 DATE_FORMAT = '%d %b %Y'
@@ -112,6 +132,75 @@ DNSTORM = {
     'site_name': 'DNStorm',
     'site_description': 'An idea-generation platform',
     'site_language': 'en_EN',
+    'jobs_inline': False,
+    'jobs_batch_size': 50,
+    'jobs_max_attempts': 5,
+    'jobs_retry_delay': 30,
+    'jobs_claim_timeout': 60 * 10,
+    'diff_max_size': 20000,
+    'diff_cache_timeout': 60 * 60 * 24,
+    'fragment_cache_timeout': 60 * 10,
+    'tooltip_cache_timeout': 60 * 60 * 24,
+    'search_max_results': 500,
+    'export_batch_size': 100,
+    'activity_box_size': 10,
+    'api_page_size': 25,
+    'api_max_page_size': 100,
+    'stream_timeout': 55,
+    'stream_poll_interval': 2,
+    'stream_event_ttl': 60 * 10,
+    'metrics': True,
+    'metrics_flush_interval': 60,
+    'query_budget_strict': False,
+    # Queries of each view measured by 'manage.py query_counts --budgets' on a
+    # run where no count grows with the dataset, the highest of all the roles.
+    # Cache queries are not counted.
+    'query_budgets': {
+        'activity': 25,
+        'activity_objects': 20,
+        'activity_problem': 28,
+        'activity_problem_objects': 23,
+        'ajax': 0,
+        'ajax:help': 0,
+        'ajax:user_search': 5,
+        'alternative_create': 13,
+        'alternative_delete': 14,
+        'alternative_update': 32,
+        'api_problem': 4,
+        'api_problem_collection': 5,
+        'api_problems': 4,
+        'comment': 3,
+        'criteria_create': 20,
+        'criteria_delete': 14,
+        'criteria_update': 14,
+        'home': 16,
+        'idea_create': 6,
+        'idea_delete': 14,
+        'idea_update': 16,
+        'import': 12,
+        'jsi18n': 0,
+        'metrics': 12,
+        'options': 12,
+        'problem': 38,
+        'problem_collaborators': 17,
+        'problem_create': 10,
+        'problem_delete': 13,
+        'problem_short': 3,
+        'problem_update': 14,
+        'problems_collaborating': 16,
+        'problems_drafts': 13,
+        'problems_export': 2,
+        'registration_register': 12,
+        'search': 12,
+        'stream': 4,
+        'user': 23,
+        'user_activate': 12,
+        'user_inactivate': 12,
+        'user_password_update': 14,
+        'user_update': 16,
+        'users': 14,
+        'users_filter': 14,
+    },
 }
 
 # Registration
@@ -18,6 +18,10 @@ DEBUG = True
 HTML_MINIFY = False
 TEMPLATE_DEBUG = DEBUG
 
+# Run background jobs within the request. Disable it to use the queue with
+# the run_jobs command.
+DNSTORM['jobs_inline'] = True
+
 TIME_ZONE = 'America/Sao_Paulo'
 LANGUAGE_CODE = 'pt-br'
 